@@ -29,8 +29,18 @@ from routes.facebook import facebook_router
 from routes.tiktok import tiktok_router
 from routes.youtube import youtube_router
 from routes.x import x_router
+from routes.ops import ops_router
+from routes.audio import audio_router
 from utils.limiter import limiter
 from utils.user import AuthService
+from common.index import (
+    start_http_session,
+    close_http_session,
+    extraction_pool,
+    media_cache,
+    search_handler,
+    transcode_cache,
+)
 
 
 import os
@@ -99,7 +109,9 @@ app.include_router(facebook_router, prefix="/api/fb")
 app.include_router(tiktok_router, prefix="/api/tk")
 app.include_router(youtube_router, prefix="/api/yt")
 app.include_router(x_router, prefix="/api/x")
+app.include_router(audio_router, prefix="/api/audio")
 app.include_router(auth_router, prefix="/api/auth")
+app.include_router(ops_router, prefix="/api/ops")
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -173,12 +185,19 @@ async def startup():
     print("🚀 Connecting to database...")
     await init_db(app)
     print("✅ DATABASE CONNECTED")
+    await start_http_session()
+    media_cache.load()
+    transcode_cache.load()
+    search_handler.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
     print("🛑 Closing DB connections...")
     await Tortoise.close_connections()
+    await search_handler.stop()
+    await close_http_session()
+    extraction_pool.shutdown()
 
 
 # uvicorn app:zed_app --reload
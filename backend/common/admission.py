@@ -0,0 +1,123 @@
+import asyncio
+from collections import deque
+from typing import Callable, Dict
+
+from utils.logger import setup_logger
+
+logger = setup_logger("ADMISSION")
+
+
+class Overloaded(RuntimeError):
+    """The worker is at capacity; callers should retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Per-worker load shedding for downloads and metadata requests.
+
+    Three independent limits:
+
+    - ``max_streams`` downloads stream at once; up to ``max_waiting`` more
+      wait at most ``wait_timeout`` seconds (FIFO) for one to finish.
+    - New metadata requests are refused while ``pending_extractions()``
+      (jobs queued for the extraction pool) is at ``max_pending_extractions``.
+    - New downloads are refused while ``buffered_bytes()`` (media held in
+      memory by broadcasts and segment prefetch) is over ``max_buffered_bytes``.
+
+    Anything refused raises ``Overloaded`` straight away, so a spike gets
+    quick 503s instead of pushing the worker into an OOM kill that would
+    take every stream in flight down with it.
+    """
+
+    def __init__(
+        self,
+        max_streams: int,
+        max_waiting: int,
+        wait_timeout: float,
+        max_pending_extractions: int,
+        max_buffered_bytes: int,
+        retry_after: float,
+        pending_extractions: Callable[[], int],
+        buffered_bytes: Callable[[], int],
+    ):
+        self.max_streams = max_streams
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.max_pending_extractions = max_pending_extractions
+        self.max_buffered_bytes = max_buffered_bytes
+        self.retry_after = retry_after
+        self._pending_extractions = pending_extractions
+        self._buffered_bytes = buffered_bytes
+        self._active = 0
+        self._waiters: deque = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {"streams": 0, "extractions": 0, "buffered": 0}
+
+    def _reject(self, reason: str, message: str):
+        self.rejected[reason] += 1
+        raise Overloaded(message, self.retry_after)
+
+    def check_extractions(self):
+        """Refuse new metadata work while the extraction queue is backed up."""
+        if self._pending_extractions() >= self.max_pending_extractions:
+            self._reject("extractions", "Too many pending extractions, try again shortly")
+
+    async def admit_stream(self):
+        """
+        Take a stream slot, waiting a bounded time for one. Every successful
+        call must be paired with ``release_stream``.
+        """
+        if self._buffered_bytes() > self.max_buffered_bytes:
+            self._reject("buffered", "Server is buffering too much media, try again shortly")
+
+        if self._active < self.max_streams and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self._reject("streams", "Too many downloads in progress, try again shortly")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.wait_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release_stream()  # handed a slot just as we gave up; pass it on
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("streams", "Timed out waiting for a download slot")
+        self.admitted += 1
+
+    def release_stream(self):
+        """Hand the slot to the next waiter, or give it back."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "active_streams": self._active,
+            "max_streams": self.max_streams,
+            "waiting": len(self._waiters),
+            "max_waiting": self.max_waiting,
+            "pending_extractions": self._pending_extractions(),
+            "max_pending_extractions": self.max_pending_extractions,
+            "buffered_bytes": self._buffered_bytes(),
+            "max_buffered_bytes": self.max_buffered_bytes,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+        }
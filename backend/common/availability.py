@@ -0,0 +1,115 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# (platform, media id, itag)
+FormatKey = Tuple[str, str, str]
+
+SERVED = "served"
+MISSING = "missing"  # not offered by the extraction
+FAILED = "failed"  # offered, but the CDN refused it (403/404/410 even after a refresh)
+TRANSIENT = "transient"  # offered, but opening it hit a reset, timeout or 5xx
+
+
+class FormatAvailability:
+    """
+    What we have learned about which formats can actually be served.
+
+    A negative cache remembers (media id, itag) pairs that were missing or
+    failed for ``ttl`` seconds, so the next request for the same video skips
+    them silently instead of repeating the failure. Per-platform outcome
+    counters per itag flag itags that fail nearly everywhere (at least
+    ``min_samples`` opens, success rate under ``bad_rate``), which are then
+    tried last within their resolution. Missing formats only say something
+    about one video, so they don't count against an itag's success rate.
+    Transient failures say nothing about the format at all: they are only
+    counted, never cached and never held against the itag.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, min_samples: int, bad_rate: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_samples = min_samples
+        self.bad_rate = bad_rate
+        self._unavailable: "OrderedDict[FormatKey, float]" = OrderedDict()
+        self._outcomes: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.skips = 0
+
+    def is_unavailable(self, platform: str, media_id: Optional[str], itag: str) -> bool:
+        if not media_id:
+            return False
+        key = (platform, media_id, itag)
+        expires = self._unavailable.get(key)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._unavailable[key]
+            return False
+        self.skips += 1
+        return True
+
+    def record(self, platform: str, media_id: Optional[str], itag: str, outcome: str):
+        counts = self._outcomes.setdefault(platform, {}).setdefault(
+            itag, {SERVED: 0, MISSING: 0, FAILED: 0, TRANSIENT: 0}
+        )
+        counts[outcome] += 1
+
+        if not media_id or outcome == TRANSIENT:
+            return
+        key = (platform, media_id, itag)
+        if outcome == SERVED:
+            self._unavailable.pop(key, None)
+            return
+        self._unavailable[key] = time.monotonic() + self.ttl
+        self._unavailable.move_to_end(key)
+        while len(self._unavailable) > self.max_entries:
+            self._unavailable.popitem(last=False)
+
+    def _opens(self, platform: str, itag: str) -> int:
+        counts = self._outcomes.get(platform, {}).get(itag)
+        return counts[SERVED] + counts[FAILED] if counts else 0
+
+    def success_rate(self, platform: str, itag: str) -> Optional[float]:
+        opens = self._opens(platform, itag)
+        if not opens:
+            return None
+        return self._outcomes[platform][itag][SERVED] / opens
+
+    def known_bad(self, platform: str, itag: str) -> bool:
+        if self._opens(platform, itag) < self.min_samples:
+            return False
+        return self.success_rate(platform, itag) < self.bad_rate
+
+    def prefer_good(
+        self, platform: str, ladder: List[Tuple[str, Optional[int]]]
+    ) -> List[Tuple[str, Optional[int]]]:
+        """Reorder a fallback ladder so known-bad itags come last within their resolution."""
+        bad = {itag for itag, _ in ladder if self.known_bad(platform, itag)}
+        if not bad:
+            return ladder
+        tiers: Dict[Optional[int], int] = {}
+        for _, res in ladder:
+            tiers.setdefault(res, len(tiers))
+        return sorted(ladder, key=lambda candidate: (tiers[candidate[1]], candidate[0] in bad))
+
+    def stats(self) -> Dict:
+        return {
+            "unavailable_entries": len(self._unavailable),
+            "max_entries": self.max_entries,
+            "skips": self.skips,
+            "platforms": {
+                platform: {
+                    itag: {
+                        **counts,
+                        "success_rate": (
+                            None
+                            if self.success_rate(platform, itag) is None
+                            else round(self.success_rate(platform, itag), 3)
+                        ),
+                        "known_bad": self.known_bad(platform, itag),
+                    }
+                    for itag, counts in sorted(itags.items())
+                }
+                for platform, itags in self._outcomes.items()
+            },
+        }
@@ -0,0 +1,161 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator
+
+from utils.logger import setup_logger
+
+logger = setup_logger("BANDWIDTH")
+
+
+class _Bucket:
+    """
+    Token bucket that goes into debt instead of making callers wait for
+    tokens up front: a chunk is charged after it is sent and the returned
+    delay pays the debt back, so the loop only ever needs one ``sleep``.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def charge(self, size: int, now: float) -> float:
+        """Take ``size`` tokens; seconds to wait before sending more."""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= size
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class _User:
+    __slots__ = ("bucket", "streams")
+
+    def __init__(self, bucket: _Bucket):
+        self.bucket = bucket
+        self.streams = 0
+
+
+class BandwidthScheduler:
+    """
+    Fair-share egress limits for download streams.
+
+    Every user (room token or client IP) gets one bucket shared by all of
+    their streams, refilled at ``min(user_rate, global_rate / active users)``
+    bytes/s; a global bucket caps the total at ``global_rate``. Either rate
+    may be 0 for no limit. Buckets hold up to ``burst`` bytes, so short clips
+    go out at full speed; a user's bucket outlives their streams (up to
+    ``max_users`` idle ones are kept) so reconnecting doesn't refill it.
+
+    Rates are rebalanced only when a user starts or stops streaming; the
+    per-chunk work is two bucket updates on preallocated objects.
+    """
+
+    def __init__(self, global_rate: float, user_rate: float, burst: int, max_users: int = 10000):
+        self.global_rate = global_rate
+        self.user_rate = user_rate
+        self.burst = burst
+        self.max_users = max_users
+        self._global = _Bucket(global_rate, max(burst, global_rate))
+        self._users: "OrderedDict[str, _User]" = OrderedDict()
+        self._active = 0
+        self.streams = 0
+        self.bytes_sent = 0
+        self.throttled_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.global_rate > 0 or self.user_rate > 0
+
+    def _share(self) -> float:
+        if self.global_rate <= 0:
+            return self.user_rate
+        share = self.global_rate / max(1, self._active)
+        return min(self.user_rate, share) if self.user_rate > 0 else share
+
+    def _rebalance(self):
+        share = self._share()
+        for user in self._users.values():
+            if user.streams:
+                user.bucket.charge(0, time.monotonic())  # settle at the old rate first
+                user.bucket.rate = share
+
+    def _join(self, key: str) -> _User:
+        user = self._users.get(key)
+        if user is None:
+            user = self._users[key] = _User(_Bucket(0.0, self.burst))
+        self._users.move_to_end(key)
+        user.streams += 1
+        self.streams += 1
+        if user.streams == 1:
+            self._active += 1
+            self._rebalance()
+        return user
+
+    def _leave(self, key: str, user: _User):
+        user.streams -= 1
+        self.streams -= 1
+        if user.streams:
+            return
+        self._active -= 1
+        self._rebalance()
+        while len(self._users) > self.max_users:
+            oldest, idle = next(iter(self._users.items()))
+            if idle.streams:
+                break
+            del self._users[oldest]
+
+    @contextlib.contextmanager
+    def stream(self, key: str) -> Iterator[Callable[[int], Awaitable[None]]]:
+        """
+        Count one stream of ``key`` for as long as the block runs. Yields
+        ``pace(size)``, to be awaited after sending each ``size`` bytes.
+        """
+        user = self._join(key)
+        bucket, total = user.bucket, self._global
+
+        async def pace(size: int):
+            self.bytes_sent += size
+            now = time.monotonic()
+            wait = max(bucket.charge(size, now), total.charge(size, now))
+            if wait > 0:
+                self.throttled_seconds += wait
+                await asyncio.sleep(wait)
+
+        try:
+            yield pace
+        finally:
+            self._leave(key, user)
+
+    async def throttle(self, key: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pass ``chunks`` through, pacing them to ``key``'s share of the bandwidth."""
+        async with contextlib.aclosing(chunks):
+            if not self.enabled:
+                async for chunk in chunks:
+                    yield chunk
+                return
+
+            with self.stream(key) as pace:
+                async for chunk in chunks:
+                    yield chunk
+                    await pace(len(chunk))
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "global_rate": self.global_rate,
+            "user_rate": self.user_rate,
+            "burst": self.burst,
+            "active_users": self._active,
+            "active_streams": self.streams,
+            "share_per_user": self._share() if self.enabled else None,
+            "tracked_users": len(self._users),
+            "bytes_sent": self.bytes_sent,
+            "throttled_seconds": round(self.throttled_seconds, 1),
+        }
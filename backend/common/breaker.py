@@ -0,0 +1,140 @@
+import contextlib
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """A platform is failing; callers should back off for ``retry_after`` seconds."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable, retry in {int(retry_after) + 1}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker.
+
+    Outcomes of the last ``window`` seconds are kept; once at least
+    ``min_calls`` of them are in and ``failure_rate`` of them failed, the
+    circuit opens and every call fails fast with ``CircuitOpen`` for
+    ``open_seconds``. After that, up to ``half_open_calls`` trial calls go
+    through: a success closes the circuit, a failure re-opens it for twice as
+    long (capped at ``max_open_seconds``).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float,
+        min_calls: int,
+        failure_rate: float,
+        open_seconds: float,
+        max_open_seconds: float,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._outcomes: deque = deque()  # (monotonic time, failed)
+        self._opened_until = 0.0
+        self._current_open = open_seconds
+        self._trials = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def before(self):
+        """Raise ``CircuitOpen`` unless a call may go through now."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now < self._opened_until:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self._opened_until - now)
+            self.state = HALF_OPEN
+            self._trials = 0
+        if self.state == HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpen(self.name, min(self.open_seconds, 5.0))
+            self._trials += 1
+
+    def after(self, failed: bool):
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self._trials = max(0, self._trials - 1)
+            if failed:
+                self._trip(now, min(self._current_open * 2, self.max_open_seconds))
+            else:
+                self.state = CLOSED
+                self._current_open = self.open_seconds
+                self._outcomes.clear()
+            return
+
+        self._outcomes.append((now, failed))
+        self._expire(now)
+        if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for _, f in self._outcomes if f)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._trip(now, self._current_open)
+
+    def _release(self):
+        """A call was abandoned (e.g. cancelled) without telling us anything."""
+        if self.state == HALF_OPEN:
+            self._trials = max(0, self._trials - 1)
+
+    def _trip(self, now: float, seconds: float):
+        self.state = OPEN
+        self._current_open = seconds
+        self._opened_until = now + seconds
+        self._outcomes.clear()
+        self.opened += 1
+
+    def _expire(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    @contextlib.contextmanager
+    def guard(self, is_failure: Callable[[BaseException], Optional[bool]]):
+        """
+        Run the body as one call. ``is_failure`` decides whether an exception
+        counts against the circuit; None means it says nothing either way.
+        """
+        self.before()
+        try:
+            yield
+        except Exception as e:
+            failed = is_failure(e)
+            if failed is None:
+                self._release()
+            else:
+                self.after(failed)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        else:
+            self.after(False)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        self._expire(now)
+        failures = sum(1 for _, f in self._outcomes if f)
+        return {
+            "state": self.state,
+            "calls_in_window": len(self._outcomes),
+            "failure_rate": round(failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+            "retry_after": round(max(0.0, self._opened_until - now), 1) if self.state == OPEN else 0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
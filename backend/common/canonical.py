@@ -0,0 +1,115 @@
+"""
+Canonical identity of media URLs.
+
+The same video reaches us as ``youtu.be/ID``, ``m.youtube.com/watch?v=ID&si=..``,
+``/shorts/ID`` and so on; ``identify`` maps all of them to one
+``MediaRef(platform, media_id)`` so caches and in-flight coalescing share
+entries. Short links (``vm.tiktok.com``, ``fb.watch``, ``t.co``...) carry no id
+and have to be resolved by following their redirect first.
+"""
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class MediaRef(NamedTuple):
+    platform: str
+    media_id: str
+
+    def __str__(self) -> str:
+        return f"{self.platform}:{self.media_id}"
+
+
+# Registrable domain -> platform name as used by StreamDownloader
+PLATFORM_DOMAINS = {
+    "youtube.com": "youtube",
+    "youtu.be": "youtube",
+    "youtube-nocookie.com": "youtube",
+    "instagram.com": "instagram",
+    "tiktok.com": "tiktok",
+    "facebook.com": "facebook",
+    "fb.watch": "facebook",
+    "fb.com": "facebook",
+    "twitter.com": "twitter",
+    "x.com": "twitter",
+    "t.co": "twitter",
+}
+
+# Hosts (or host/path prefixes) whose links are opaque redirects to the real page
+SHORT_LINK_HOSTS = {"vm.tiktok.com", "vt.tiktok.com", "fb.watch", "t.co"}
+_SHORT_LINK_PATHS = {
+    "tiktok": re.compile(r"^/t/[^/]+"),
+    "facebook": re.compile(r"^/share/(?:v|r|p)/[^/]+"),
+}
+
+_YOUTUBE_ID = r"(?P<id>[A-Za-z0-9_-]{11})"
+_ID_PATTERNS = {
+    "youtube": [
+        re.compile(rf"^/(?:shorts|embed|live|v|e)/{_YOUTUBE_ID}(?:[/?#]|$)"),
+    ],
+    "instagram": [
+        re.compile(r"^/(?:[^/]+/)?(?:p|reels?|tv)/(?P<id>[A-Za-z0-9_-]+)"),
+    ],
+    "tiktok": [
+        re.compile(r"^/@[^/]+/(?:video|photo)/(?P<id>\d+)"),
+        re.compile(r"^/(?:v|embed(?:/v2)?)/(?P<id>\d+)"),
+    ],
+    "facebook": [
+        re.compile(r"^/(?:[^/]+/)?videos/(?:[^/]+/)?(?P<id>\d+)"),
+        re.compile(r"^/reel/(?P<id>\d+)"),
+    ],
+    "twitter": [
+        re.compile(r"^/(?:[^/]+|i(?:/web)?)/status(?:es)?/(?P<id>\d+)"),
+    ],
+}
+
+
+def _host(url: str) -> str:
+    host = (urlparse(url.strip()).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def platform_for_url(url: str) -> Optional[str]:
+    """Platform of ``url`` by registrable domain (not substring), or None."""
+    host = _host(url)
+    for domain, platform in PLATFORM_DOMAINS.items():
+        if host == domain or host.endswith("." + domain):
+            return platform
+    return None
+
+
+def is_short_link(url: str) -> bool:
+    host = _host(url)
+    if host in SHORT_LINK_HOSTS:
+        return True
+    pattern = _SHORT_LINK_PATHS.get(platform_for_url(url) or "")
+    return bool(pattern and pattern.match(urlparse(url).path))
+
+
+def identify(url: str) -> Optional[MediaRef]:
+    """
+    ``MediaRef`` for a direct media URL, or None when the URL doesn't name a
+    single media item (playlists, profiles, short links still to resolve).
+    """
+    platform = platform_for_url(url)
+    if platform is None:
+        return None
+    parsed = urlparse(url.strip())
+    query = parse_qs(parsed.query)
+
+    if platform == "youtube":
+        if _host(url) == "youtu.be":
+            match = re.match(rf"^/{_YOUTUBE_ID}", parsed.path)
+            return MediaRef(platform, match.group("id")) if match else None
+        if parsed.path.rstrip("/") == "/watch" and query.get("v"):
+            video_id = query["v"][0]
+            return MediaRef(platform, video_id) if re.fullmatch(_YOUTUBE_ID, video_id) else None
+
+    if platform == "facebook" and parsed.path.rstrip("/") == "/watch" and query.get("v"):
+        return MediaRef(platform, query["v"][0])
+
+    for pattern in _ID_PATTERNS.get(platform, []):
+        match = pattern.match(parsed.path)
+        if match:
+            return MediaRef(platform, match.group("id"))
+    return None
@@ -0,0 +1,91 @@
+"""
+Entry points executed inside extraction worker processes.
+
+Kept free of app imports (config, DB, spotipy...) so a freshly spawned or
+recycled worker only pays for importing yt-dlp itself.
+"""
+import sys
+
+import yt_dlp
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def warm_worker():
+    """Process-pool initializer: load every extractor class once per worker."""
+    from yt_dlp.extractor import gen_extractor_classes
+
+    for _ in gen_extractor_classes():
+        pass
+
+
+def peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def extract(url: str, ydl_opts: dict):
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def extract_in_process(url: str, ydl_opts: dict):
+    """Extract and return a picklable info dict plus this worker's peak RSS."""
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            if info:
+                info = ydl.sanitize_info(info)
+    except yt_dlp.utils.YoutubeDLError as e:
+        # yt-dlp errors carry exc_info and loggers that can't be pickled back to
+        # the parent; send just the message, which is what callers match on
+        raise yt_dlp.utils.DownloadError(str(e)) from None
+    return info, peak_rss_bytes()
+
+
+def iter_playlist(url, ydl_opts, on_title, on_page, page_size, max_entries, stop):
+    """
+    Walk a flat playlist lazily, handing its entries to ``on_page`` in pages
+    as yt-dlp produces them instead of materializing the whole list.
+
+    Thread-only: the callbacks and the ``stop`` event can't cross a process
+    boundary.
+    """
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        # Redirect-style results (e.g. a watch URL carrying a list) point at the real playlist
+        for _ in range(3):
+            if not info or info.get("_type") not in ("url", "url_transparent"):
+                break
+            info = ydl.extract_info(
+                info["url"], ie_key=info.get("ie_key"), download=False, process=False
+            )
+        if not info:
+            return
+
+        on_title(info.get("title"))
+        page, count = [], 0
+        for entry in info.get("entries") or []:
+            if stop.is_set() or count >= max_entries:
+                break
+            if not entry:
+                continue  # Skip None entries
+            page.append(
+                {
+                    "title": entry.get("title", "Untitled"),
+                    "url": entry.get("url"),
+                    "id": entry.get("id"),
+                }
+            )
+            count += 1
+            if len(page) >= page_size:
+                on_page(page)
+                page = []
+        if page:
+            on_page(page)
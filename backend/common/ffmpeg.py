@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import os
+import shutil
+from collections import deque
+from typing import AsyncIterator, Dict, List
+
+from utils.logger import setup_logger
+
+logger = setup_logger("FFMPEG")
+
+
+class FfmpegBusy(RuntimeError):
+    pass
+
+
+class FfmpegPool:
+    """
+    Per-worker cap on concurrent ffmpeg processes.
+
+    Up to ``max_processes`` pipelines run at once; up to ``max_waiting`` more
+    wait at most ``wait_timeout`` seconds for a slot. Anything beyond that is
+    refused with ``FfmpegBusy`` so callers can shed load instead of piling up.
+    """
+
+    PIPE_CHUNK = 64 * 1024
+
+    def __init__(self, max_processes: int, max_waiting: int, wait_timeout: float):
+        self.max_processes = max_processes
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._slots = asyncio.Semaphore(max_processes)
+        self._running = 0
+        self._waiting = 0
+        self.started = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self._running >= self.max_processes and self._waiting >= self.max_waiting
+
+    def check_available(self):
+        if not shutil.which("ffmpeg"):
+            raise RuntimeError("FFmpeg not found in PATH. Please install FFmpeg first.")
+        if self.saturated:
+            self.rejected += 1
+            raise FfmpegBusy("All ffmpeg workers are busy, try again shortly")
+
+    async def _acquire(self):
+        if self._waiting >= self.max_waiting and self._slots.locked():
+            self.rejected += 1
+            raise FfmpegBusy("All ffmpeg workers are busy, try again shortly")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise FfmpegBusy("Timed out waiting for an ffmpeg worker")
+        finally:
+            self._waiting -= 1
+        self._running += 1
+
+    def _release(self):
+        self._running -= 1
+        self._slots.release()
+
+    async def run(
+        self, args: List[str], inputs: List[AsyncIterator[bytes]]
+    ) -> AsyncIterator[bytes]:
+        """
+        Run ``ffmpeg <args>`` with ``inputs`` piped in and yield its stdout.
+
+        The first input is fed through stdin, any further ones through extra
+        pipes passed as ``pipe:<fd>``; reference them in ``args`` with the
+        ``{input0}``, ``{input1}``... placeholders. Every pipe is written with
+        back-pressure (``drain``), so memory per pipeline stays at a few
+        pipe buffers regardless of the media size.
+        """
+        await self._acquire()
+        loop = asyncio.get_running_loop()
+        extra = [os.pipe() for _ in inputs[1:]]
+        placeholders = {"input0": "pipe:0"}
+        placeholders.update({f"input{i + 1}": f"pipe:{r}" for i, (r, _) in enumerate(extra)})
+
+        proc = None
+        tasks: List[asyncio.Task] = []
+        stderr_tail: deque = deque(maxlen=20)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg",
+                "-hide_banner",
+                "-loglevel", "error",
+                *[a.format(**placeholders) for a in args],
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                pass_fds=[r for r, _ in extra],
+            )
+            self.started += 1
+
+            writers = [proc.stdin]
+            for r, w in extra:
+                os.close(r)  # the child holds its own copy
+                transport, protocol = await loop.connect_write_pipe(
+                    asyncio.streams.FlowControlMixin, os.fdopen(w, "wb", buffering=0)
+                )
+                writers.append(asyncio.StreamWriter(transport, protocol, None, loop))
+            extra = []
+
+            tasks = [
+                asyncio.ensure_future(self._feed(source, writer))
+                for source, writer in zip(inputs, writers)
+            ]
+            tasks.append(asyncio.ensure_future(self._drain_stderr(proc, stderr_tail)))
+
+            while True:
+                chunk = await proc.stdout.read(self.PIPE_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+
+            await proc.wait()
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception():
+                    raise task.exception()
+            if proc.returncode != 0:
+                self.failed += 1
+                raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {' '.join(stderr_tail)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            for r, w in extra:
+                os.close(r)
+                os.close(w)
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            self._release()
+
+    async def _feed(self, source: AsyncIterator[bytes], writer: asyncio.StreamWriter):
+        try:
+            async with contextlib.aclosing(source):
+                async for chunk in source:
+                    writer.write(chunk)
+                    await writer.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg stopped reading (finished or failed); its exit status tells which
+        finally:
+            writer.close()
+
+    async def _drain_stderr(self, proc, tail: deque):
+        async for line in proc.stderr:
+            tail.append(line.decode(errors="replace").strip())
+
+    def stats(self) -> Dict:
+        return {
+            "max_processes": self.max_processes,
+            "running": self._running,
+            "waiting": self._waiting,
+            "started": self.started,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
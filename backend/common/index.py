@@ -15,7 +15,28 @@ import subprocess
 from typing import AsyncGenerator, Optional, Tuple, List, Dict, Union
 import shutil
 import os
-import requests
+import time
+import threading
+import heapq
+import itertools
+import contextlib
+import weakref
+import random
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from common import extract_worker
+from common.media_cache import MediaCache
+from common.ffmpeg import FfmpegPool, FfmpegBusy
+from common.zipstream import ZipStream
+from common.canonical import MediaRef, identify, is_short_link, platform_for_url
+from common import availability
+from common.availability import FormatAvailability
+from common.breaker import CircuitBreaker, CircuitOpen
+from common.admission import AdmissionController, Overloaded
+from common.bandwidth import BandwidthScheduler
+from config import Config
 from pytube import Search
 
 import spotipy, json, os
@@ -58,288 +79,2667 @@ class UnsupportedPlatformError(Exception):
     pass
 
 
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+async def start_http_session() -> aiohttp.ClientSession:
+    """
+    Create the app-lifetime upstream connection pool.
+
+    Called once at startup; every upstream fetch shares it so connections,
+    DNS lookups and TLS sessions to googlevideo/cdninstagram are reused.
+    """
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        return _http_session
+
+    connector = aiohttp.TCPConnector(
+        limit=Config.HTTP_POOL_LIMIT,
+        limit_per_host=Config.HTTP_POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=Config.HTTP_DNS_TTL,
+        keepalive_timeout=Config.HTTP_KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None,  # media streams can legitimately run for a long time
+        sock_connect=Config.HTTP_CONNECT_TIMEOUT,
+        sock_read=Config.HTTP_READ_TIMEOUT,
+    )
+    _http_session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers=StreamMeta.DEFAULT_HEADERS,
+    )
+    logger.info("Upstream HTTP pool started")
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+        logger.info("Upstream HTTP pool closed")
+    _http_session = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared session, starting it lazily outside the app lifecycle."""
+    if _http_session is None or _http_session.closed:
+        return await start_http_session()
+    return _http_session
+
+
+# Options that only change yt-dlp's console/output behaviour, not the extracted info
+_CACHE_IGNORED_OPTS = {
+    "quiet",
+    "no_warnings",
+    "simulate",
+    "skip_download",
+    "listformats",
+    "forceurl",
+    "socket_timeout",
+}
+
+_TRACKING_PARAMS = {"si", "feature", "pp", "igsh", "igshid", "utm_source", "utm_medium", "utm_campaign"}
+
+_EXPIRE_RE = re.compile(r"[?&/]expire[=/](\d+)")
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a media URL so trivially different links share cache entries."""
+    parsed = urlparse(url.strip())
+    query = sorted(
+        (k, v)
+        for k, v in urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+        if k not in _TRACKING_PARAMS
+    )
+    return urllib.parse.urlunparse((
+        (parsed.scheme or "https").lower(),
+        parsed.netloc.lower(),
+        parsed.path.rstrip("/") or "/",
+        "",
+        urllib.parse.urlencode(query),
+        "",
+    ))
+
+
+class ExtractionCache:
+    """
+    LRU cache of yt-dlp info dicts.
+
+    Entries expire with the earliest signed media URL (``expire=``) found in the
+    info, capped at ``max_ttl`` seconds, and are evicted least-recently-used
+    first once ``max_entries`` or ``max_bytes`` is exceeded.
+    """
+
+    EXPIRE_MARGIN = 60  # seconds; don't hand out URLs about to expire
+
+    # Approximate JSON sizes used to weigh entries against ``max_bytes``
+    INFO_BYTES = 4096
+    FORMAT_BYTES = 512
+    THUMBNAIL_BYTES = 160
+    ENTRY_BYTES = 512
+
+    def __init__(self, max_entries: int, max_bytes: int, max_ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(url: str, ydl_opts: Dict, ref: Optional[MediaRef] = None) -> str:
+        """
+        Key on the media identity when known, so every URL form of one video
+        shares an entry; a YouTube ``list=`` URL extracted without
+        ``noplaylist`` means the playlist, not the video, and keeps its URL.
+        """
+        opts = {k: v for k, v in ydl_opts.items() if k not in _CACHE_IGNORED_OPTS}
+        if ref is not None and ref.platform == "youtube" and not ydl_opts.get("noplaylist"):
+            if "list" in urllib.parse.parse_qs(urlparse(url).query):
+                ref = None
+        ident = str(ref) if ref is not None else canonical_url(url)
+        return f"{ident}|{json.dumps(opts, sort_keys=True, default=str)}"
+
+    def _ttl_for(self, info: Dict) -> float:
+        urls = [info.get("url")] + [f.get("url") for f in info.get("formats") or []]
+        expires = [
+            int(m.group(1))
+            for m in (_EXPIRE_RE.search(u) for u in urls if u)
+            if m
+        ]
+        ttl = self.max_ttl
+        if expires:
+            ttl = min(ttl, min(expires) - time.time() - self.EXPIRE_MARGIN)
+        return ttl
+
+    @classmethod
+    def _estimate_size(cls, info: Dict) -> int:
+        """
+        Rough serialized size of ``info``. Serializing the whole dict would
+        block the event loop for milliseconds on big playlists, so this only
+        counts formats, entries and the long strings (URLs, description).
+        """
+        size = cls.INFO_BYTES + len(info.get("description") or "")
+        size += cls.THUMBNAIL_BYTES * len(info.get("thumbnails") or [])
+        for f in info.get("formats") or []:
+            size += cls.FORMAT_BYTES + len(f.get("url") or "") + len(f.get("fragments") or []) * 64
+        return size + cls.ENTRY_BYTES * len(info.get("entries") or [])
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _, info = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return info
+
+    def set(self, key: str, info: Dict):
+        ttl = self._ttl_for(info)
+        if ttl <= 0:
+            return
+
+        size = self._estimate_size(info)
+        if size > self.max_bytes:
+            return
+
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, info)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+
+extraction_cache = ExtractionCache(
+    max_entries=Config.EXTRACT_CACHE_MAX_ENTRIES,
+    max_bytes=Config.EXTRACT_CACHE_MAX_BYTES,
+    max_ttl=Config.EXTRACT_CACHE_MAX_TTL,
+)
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key onto one in-flight task.
+
+    Every caller awaits the shared task through ``asyncio.shield`` so a caller
+    being cancelled (e.g. client disconnect) only detaches that caller. The
+    shared task is cancelled once its last waiter has gone, and forgotten at
+    once, so a caller arriving while it unwinds starts a new one.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, coro_factory):
+        flight = self._flights.get(key)
+        if flight is None or flight.task.cancelled():
+            flight = _Flight(asyncio.ensure_future(coro_factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                logger.debug("No waiters left for %s, cancelling extraction", key)
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+extraction_flights = SingleFlight()
+
+
+class ShortLinkResolver:
+    """
+    Follows short links (vm.tiktok.com, fb.watch, t.co...) to the page they
+    redirect to, so they can be identified like any other URL. Targets are
+    cached for ``ttl`` seconds and concurrent lookups of one link share a
+    request; a failed lookup leaves the link as is for yt-dlp to follow.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, timeout: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._targets: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    async def resolve(self, url: str) -> str:
+        if not is_short_link(url):
+            return url
+        key = canonical_url(url)
+        cached = self._targets.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._targets.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        return await self._flights.do(key, lambda: self._follow(key, url))
+
+    async def _follow(self, key: str, url: str) -> str:
+        session = await get_http_session()
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        try:
+            async with session.head(url, allow_redirects=True, timeout=timeout) as response:
+                target = str(response.url)
+            if target == url or response.status >= 400:
+                # Some shorteners only redirect GETs
+                async with session.get(url, allow_redirects=True, timeout=timeout) as response:
+                    target = str(response.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug("Could not resolve short link %s: %s", url, e)
+            self.failures += 1
+            return url
+
+        self._targets[key] = (time.monotonic() + self.ttl, target)
+        self._targets.move_to_end(key)
+        while len(self._targets) > self.max_entries:
+            self._targets.popitem(last=False)
+        return target
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._targets),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+        }
+
+
+short_links = ShortLinkResolver(
+    ttl=Config.SHORTLINK_CACHE_TTL,
+    max_entries=Config.SHORTLINK_CACHE_MAX,
+    timeout=Config.SHORTLINK_TIMEOUT,
+)
+
+
+async def resolve_media_url(url: str) -> Tuple[str, Optional[MediaRef]]:
+    """
+    Canonicalization stage: follow a short link if needed and identify the
+    media. Returns the URL to extract from and its ``MediaRef`` (None when the
+    URL doesn't name a single media item).
+    """
+    resolved = await short_links.resolve(url)
+    return resolved, identify(resolved)
+
+
+PRIORITY_METADATA = 0  # get-formats / download-meta: cheap, user is waiting on a dialog
+PRIORITY_DOWNLOAD = 1  # full download extractions
+PRIORITY_PREFETCH = 2  # speculative look-ahead; only runs when nothing else is waiting
+
+_PRIORITY_NAMES = {
+    PRIORITY_METADATA: "metadata",
+    PRIORITY_DOWNLOAD: "download",
+    PRIORITY_PREFETCH: "prefetch",
+}
+
+
+class ExtractionQueueFull(RuntimeError):
+    pass
+
+
+class ExtractionTimeout(asyncio.TimeoutError):
+    pass
+
+
+class _LatencyStats:
+    __slots__ = ("count", "total", "max", "window")
+
+    def __init__(self, window: int = 500):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.window.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        if not self.window:
+            return 0.0
+        ordered = sorted(self.window)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def as_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0,
+            "p95_ms": round(self.percentile(0.95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class ExtractionPool:
+    """
+    Dedicated, bounded worker pool for blocking yt-dlp calls.
+
+    At most ``workers`` jobs run at once; further jobs wait in a priority queue
+    (lower value first, FIFO within a class) of at most ``max_queue`` entries,
+    beyond which ``ExtractionQueueFull`` is raised instead of queueing forever.
+
+    ``mode="thread"`` runs jobs on threads of this process. ``mode="process"``
+    runs them on warm worker processes with yt-dlp preloaded, which keeps the
+    GIL-heavy extraction off the event loop's process. Each worker is replaced
+    after ``max_jobs_per_worker`` jobs, and the whole pool is recycled as soon
+    as a worker reports a peak RSS above ``max_worker_rss``.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        mode: str = "thread",
+        max_jobs_per_worker: int = 50,
+        max_worker_rss: int = 512 * 1024 * 1024,
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown extraction mode: {mode}")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.mode = mode
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_worker_rss = max_worker_rss
+        self.recycled = 0
+        self._pool_jobs = 0
+        self._executor = self._make_executor()
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._running = 0
+        self._queued = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._tagged: Dict[str, Tuple[int, asyncio.Future]] = {}
+        self._seq = itertools.count()
+        self.rejected = 0
+        self.promoted = 0
+        self.timed_out = 0
+        self._wait_stats: Dict[int, _LatencyStats] = {}
+        self._run_stats: Dict[int, _LatencyStats] = {}
+
+    async def run(
+        self,
+        func,
+        *args,
+        priority: int = PRIORITY_DOWNLOAD,
+        executor=None,
+        tag: str = None,
+        timeout: float = None,
+    ):
+        """
+        Run ``func(*args)`` once a slot is free. ``executor`` overrides where it
+        runs (e.g. ``thread_executor``) while still counting against the limits.
+        A queued job with a ``tag`` can be moved up later with ``promote``.
+
+        ``timeout`` bounds the run itself, not the wait for a slot. A worker
+        can't be interrupted, so a job that times out or whose caller is
+        cancelled keeps its slot until it actually returns; the caller gets
+        ``ExtractionTimeout`` (or its cancellation) right away. A job cancelled
+        before a worker picked it up never runs.
+        """
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.monotonic()
+
+        if self._running >= self.workers or self._queued:
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise ExtractionQueueFull("Extraction queue is full, try again shortly")
+            await self._wait_for_slot(loop, priority, tag)
+        else:
+            self._running += 1
+
+        started_at = time.monotonic()
+        self._wait_stats.setdefault(priority, _LatencyStats()).add(started_at - enqueued_at)
+        try:
+            job = (executor or self._executor).submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+
+        def finished():
+            self._run_stats.setdefault(priority, _LatencyStats()).add(
+                time.monotonic() - started_at
+            )
+            self._release()
+
+        def on_done(_):
+            # Runs on the worker thread (or ours, when cancelled before starting)
+            try:
+                loop.call_soon_threadsafe(finished)
+            except RuntimeError:
+                pass  # loop already closed at shutdown
+
+        job.add_done_callback(on_done)
+        future = asyncio.wrap_future(job, loop=loop)
+        if timeout is None:
+            return await future
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                raise
+            self.timed_out += 1
+            raise ExtractionTimeout(f"Extraction took longer than {timeout:.1f}s") from None
+
+    async def _wait_for_slot(self, loop, priority: int, tag: str = None):
+        waiter = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        self._queued += 1
+        if tag is not None:
+            self._tagged[tag] = (priority, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed to us just as we were cancelled; pass it on.
+                self._release()
+            else:
+                self._queued -= 1
+            raise
+        finally:
+            if tag is not None and self._tagged.get(tag, (None, None))[1] is waiter:
+                del self._tagged[tag]
+
+    def promote(self, tag: str, priority: int):
+        """
+        Move a queued job up to ``priority``, e.g. when a download joins an
+        extraction that was only queued as a prefetch.
+        """
+        entry = self._tagged.get(tag)
+        if entry is None or entry[0] <= priority or entry[1].done():
+            return
+        # The old heap entry stays behind; _release skips waiters that are already done.
+        heapq.heappush(self._waiters, (priority, next(self._seq), entry[1]))
+        self._tagged[tag] = (priority, entry[1])
+        self.promoted += 1
+
+    def _release(self):
+        """Hand the freed slot to the next live waiter, or return it to the pool."""
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self._queued -= 1
+                waiter.set_result(None)
+                return
+        self._running -= 1
+
+    def _make_executor(self):
+        if self.mode == "thread":
+            return ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="yt-extract"
+            )
+
+        # spawn, not fork: forking a process that runs an event loop and holds
+        # open sockets copies them into every worker
+        kwargs = {
+            "initializer": extract_worker.warm_worker,
+            "mp_context": multiprocessing.get_context("spawn"),
+        }
+        if sys.version_info >= (3, 11):
+            kwargs["max_tasks_per_child"] = self.max_jobs_per_worker
+        return ProcessPoolExecutor(max_workers=self.workers, **kwargs)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def thread_executor(self) -> ThreadPoolExecutor:
+        """Threads for jobs that call back into the event loop, whatever the mode."""
+        if self.mode == "thread":
+            return self._executor
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="yt-extract"
+            )
+        return self._threads
+
+    def _recycle(self, reason: str):
+        logger.info("Recycling extraction worker processes: %s", reason)
+        old, self._executor = self._executor, self._make_executor()
+        self._pool_jobs = 0
+        self.recycled += 1
+        old.shutdown(wait=False)  # in-flight jobs on the old workers still finish
+
+    async def extract(
+        self,
+        url: str,
+        ydl_opts: Dict,
+        priority: int = PRIORITY_DOWNLOAD,
+        tag: str = None,
+        timeout: float = None,
+    ) -> Dict:
+        if self.mode == "thread":
+            return await self.run(
+                extract_worker.extract, url, ydl_opts, priority=priority, tag=tag, timeout=timeout
+            )
+
+        executor = self._executor
+        try:
+            info, rss = await self.run(
+                extract_worker.extract_in_process,
+                url,
+                ydl_opts,
+                priority=priority,
+                tag=tag,
+                timeout=timeout,
+            )
+        except BrokenProcessPool:
+            if executor is self._executor:
+                self._recycle("worker process died")
+            raise
+
+        if executor is self._executor:
+            self._pool_jobs += 1
+            if rss > self.max_worker_rss:
+                self._recycle(f"worker RSS {rss // (1024 * 1024)} MB")
+            elif (
+                sys.version_info < (3, 11)
+                and self._pool_jobs >= self.max_jobs_per_worker * self.workers
+            ):
+                self._recycle(f"{self._pool_jobs} jobs served")
+        return info
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "recycled": self.recycled,
+            "running": self._running,
+            "queue_depth": self._queued,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "promoted": self.promoted,
+            "timed_out": self.timed_out,
+            "wait": {
+                _PRIORITY_NAMES.get(p, str(p)): s.as_dict()
+                for p, s in self._wait_stats.items()
+            },
+            "run": {
+                _PRIORITY_NAMES.get(p, str(p)): s.as_dict()
+                for p, s in self._run_stats.items()
+            },
+        }
+
+
+extraction_pool = ExtractionPool(
+    workers=Config.EXTRACT_WORKERS,
+    max_queue=Config.EXTRACT_QUEUE_SIZE,
+    mode=Config.EXTRACT_MODE,
+    max_jobs_per_worker=Config.EXTRACT_WORKER_MAX_JOBS,
+    max_worker_rss=Config.EXTRACT_WORKER_MAX_RSS_MB * 1024 * 1024,
+)
+
+
+# Error text that means the platform is throttling us or not answering, as
+# opposed to this particular video being private, removed or geo-blocked
+_PLATFORM_FAILURE_MARKERS = (
+    "429",
+    "too many requests",
+    "rate-limit",
+    "rate limit",
+    "timed out",
+    "temporarily unavailable",
+    "unable to download webpage",
+    "connection reset",
+    "http error 5",
+)
+
+
+def is_platform_failure(exc: BaseException) -> Optional[bool]:
+    """
+    Whether ``exc`` counts against the platform's circuit. None for errors
+    that say nothing about the platform (our own queue being full, a bad range).
+    """
+    if isinstance(exc, (ExtractionQueueFull, CircuitOpen, RangeNotSatisfiable)):
+        return None
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status == 429 or exc.status >= 500
+    if isinstance(exc, aiohttp.ClientError):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in _PLATFORM_FAILURE_MARKERS)
+
+
+class PlatformHealth:
+    """
+    Per-platform circuit breakers and adaptive extraction timeouts.
+
+    The extraction timeout of a platform is its observed p95 extraction
+    latency times ``timeout_factor``, clamped to ``[min_timeout,
+    max_timeout]``; until ``min_samples`` extractions have been timed it is
+    ``max_timeout``.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        min_calls: int,
+        failure_rate: float,
+        open_seconds: float,
+        max_open_seconds: float,
+        min_timeout: float,
+        max_timeout: float,
+        timeout_factor: float,
+        min_samples: int,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self.min_samples = min_samples
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, _LatencyStats] = {}
+
+    def breaker(self, platform: str) -> CircuitBreaker:
+        breaker = self._breakers.get(platform)
+        if breaker is None:
+            breaker = self._breakers[platform] = CircuitBreaker(
+                platform,
+                window=self.window,
+                min_calls=self.min_calls,
+                failure_rate=self.failure_rate,
+                open_seconds=self.open_seconds,
+                max_open_seconds=self.max_open_seconds,
+            )
+        return breaker
+
+    def record_latency(self, platform: str, seconds: float):
+        self._latency.setdefault(platform, _LatencyStats(window=200)).add(seconds)
+
+    def extract_timeout(self, platform: str) -> float:
+        stats = self._latency.get(platform)
+        if stats is None or len(stats.window) < self.min_samples:
+            return self.max_timeout
+        timeout = stats.percentile(0.95) * self.timeout_factor
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    def stats(self) -> Dict:
+        platforms = set(self._breakers) | set(self._latency)
+        return {
+            platform: {
+                **(self._breakers[platform].stats() if platform in self._breakers else {}),
+                "extract_timeout_s": round(self.extract_timeout(platform), 1),
+                "extract_latency": (
+                    self._latency[platform].as_dict() if platform in self._latency else None
+                ),
+            }
+            for platform in sorted(platforms)
+        }
+
+
+platform_health = PlatformHealth(
+    window=Config.BREAKER_WINDOW,
+    min_calls=Config.BREAKER_MIN_CALLS,
+    failure_rate=Config.BREAKER_FAILURE_RATE,
+    open_seconds=Config.BREAKER_OPEN_SECONDS,
+    max_open_seconds=Config.BREAKER_MAX_OPEN_SECONDS,
+    min_timeout=Config.EXTRACT_TIMEOUT_MIN,
+    max_timeout=Config.EXTRACT_TIMEOUT_MAX,
+    timeout_factor=Config.EXTRACT_TIMEOUT_FACTOR,
+    min_samples=Config.EXTRACT_TIMEOUT_MIN_SAMPLES,
+)
+
+
+async def extract_info(
+    url: str, ydl_opts: Dict, priority: int = PRIORITY_DOWNLOAD, fresh: bool = False
+) -> Dict:
+    """
+    Run yt-dlp extraction on the extraction pool, served from the shared cache
+    when fresh and coalesced with any identical extraction already in flight.
+
+    ``fresh=True`` skips the cache lookup, e.g. when a cached signed URL has
+    been rejected by the CDN; the new result replaces the cached one.
+
+    Extractions of a known platform go through its circuit breaker (raising
+    ``CircuitOpen`` while it is open) and are bounded by its adaptive timeout.
+    """
+    url, ref = await resolve_media_url(url)
+    key = ExtractionCache.make_key(url, ydl_opts, ref)
+    info = None if fresh else extraction_cache.get(key)
+    if info is not None:
+        return info
+    platform = ref.platform if ref else platform_for_url(url)
+
+    async def run():
+        if platform is None:
+            result = await extraction_pool.extract(url, ydl_opts, priority, tag=key)
+        else:
+            timeout = platform_health.extract_timeout(platform)
+            # Keep single network reads well inside the overall budget
+            opts = {
+                **ydl_opts,
+                "socket_timeout": min(ydl_opts.get("socket_timeout") or timeout, max(5, timeout / 3)),
+            }
+            with platform_health.breaker(platform).guard(is_platform_failure):
+                started_at = time.monotonic()
+                result = await extraction_pool.extract(
+                    url, opts, priority, tag=key, timeout=timeout
+                )
+                platform_health.record_latency(platform, time.monotonic() - started_at)
+        if result:
+            extraction_cache.set(key, result)
+        return result
+
+    # Joining a lower-priority flight (e.g. a prefetch) must not wait at its priority
+    extraction_pool.promote(key, priority)
+    return await extraction_flights.do(key, run)
+
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, total: Optional[int] = None):
+        super().__init__("Requested range not satisfiable")
+        self.total = total
+
+
+_RANGE_RE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", re.IGNORECASE)
+_CONTENT_RANGE_RE = re.compile(r"^\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*$", re.IGNORECASE)
+
+# (start, end) with inclusive end; start=None is a suffix range ("last N bytes")
+ByteRange = Tuple[Optional[int], Optional[int]]
+
+
+def parse_range_header(value: Optional[str]) -> Optional[ByteRange]:
+    """
+    Parse a single-range ``Range: bytes=...`` header.
+
+    Malformed and multi-range headers return None, i.e. the Range header is
+    ignored and the full body is served, as RFC 9110 allows.
+    """
+    if not value:
+        return None
+    m = _RANGE_RE.match(value)
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+
+    start = int(m.group(1)) if m.group(1) else None
+    end = int(m.group(2)) if m.group(2) else None
+    if start is not None and end is not None and end < start:
+        return None
+    return start, end
+
+
+def resolve_range(byte_range: ByteRange, total: int) -> Tuple[int, int]:
+    """Turn a requested range into absolute inclusive offsets within ``total`` bytes."""
+    start, end = byte_range
+    if start is None:
+        start, end = max(total - end, 0), total - 1
+    end = total - 1 if end is None else min(end, total - 1)
+    if start >= total:
+        raise RangeNotSatisfiable(total)
+    return start, end
+
+
+_CLEN_RE = re.compile(r"[?&/;]clen[=/](\d+)")
+
+
+def parse_clen(url: Optional[str]) -> Optional[int]:
+    """Exact media size from googlevideo's ``clen`` URL parameter, if present."""
+    if not url:
+        return None
+    clen = urllib.parse.parse_qs(urllib.parse.urlparse(url).query).get("clen")
+    if clen and clen[0].isdigit():
+        return int(clen[0])
+    # Manifest-style URLs carry it as a path segment or inside an encoded parameter
+    match = _CLEN_RE.search(urllib.parse.unquote(url))
+    return int(match.group(1)) if match else None
+
+
+def format_range_header(byte_range: ByteRange) -> str:
+    start, end = byte_range
+    if start is None:
+        return f"bytes=-{end}"
+    return f"bytes={start}-{'' if end is None else end}"
+
+
+class MediaStream:
+    """
+    An opened upstream media response.
+
+    Status, length and range are known before any body byte is sent, so
+    routes can put them in real response headers. If the upstream ignored a
+    Range request but reported its size, the requested slice is cut out here
+    so the client still gets a correct 206.
+    """
+
+    CHUNK_SIZE = 1024 * 64
+
+    def __init__(self, response: aiohttp.ClientResponse, byte_range: Optional[ByteRange] = None):
+        self.response = response
+        self.content_type = response.headers.get("Content-Type")
+        self.status = 200
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.total: Optional[int] = None
+        self.content_length: Optional[int] = None
+        self._skip = 0
+        self._limit: Optional[int] = None
+
+        encoded = bool(response.headers.get("Content-Encoding"))
+        length = response.headers.get("Content-Length")
+        length = int(length) if length and length.isdigit() and not encoded else None
+
+        content_range = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+        if response.status == 206 and content_range:
+            self.status = 206
+            self.start, self.end = int(content_range.group(1)), int(content_range.group(2))
+            total = content_range.group(3)
+            self.total = int(total) if total != "*" else None
+            self.content_length = self.end - self.start + 1
+            return
+
+        self.total = length
+        self.content_length = length
+        if byte_range is None or self.total is None:
+            if byte_range is not None:
+                logger.warning("Upstream ignored Range and sent no length; serving full body")
+            return
+
+        # Upstream answered 200 to a range request: emulate the range ourselves.
+        try:
+            start, end = resolve_range(byte_range, self.total)
+        except RangeNotSatisfiable:
+            response.release()
+            raise
+
+        self.status = 206
+        self.start, self.end = start, end
+        self.content_length = end - start + 1
+        self._skip = start
+        self._limit = self.content_length
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Accept-Ranges": "bytes"}
+        if self.content_length is not None:
+            headers["Content-Length"] = str(self.content_length)
+        if self.status == 206:
+            headers["Content-Range"] = f"bytes {self.start}-{self.end}/{self.total or '*'}"
+        return headers
+
+    async def iter_chunks(self, chunk_size: int = CHUNK_SIZE):
+        skip, remaining = self._skip, self._limit
+        completed = False
+        try:
+            async for chunk in self.response.content.iter_chunked(chunk_size):
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk, skip = chunk[skip:], 0
+                if remaining is not None:
+                    chunk = chunk[:remaining]
+                    remaining -= len(chunk)
+                yield chunk
+                if remaining == 0:
+                    break
+            completed = remaining is None
+        finally:
+            if completed:
+                self.response.release()
+            else:
+                # Abandoned (or cut short): drop the connection instead of
+                # leaving the rest of the body to be drained
+                self.response.close()
+
+    def close(self):
+        self.response.close()
+
+
+class SegmentedMediaStream(MediaStream):
+    """
+    Large media fetched as concurrent byte-range segments, yielded in order.
+
+    The first segment streams straight from the already-open response while
+    the following ones download in the background. At most ``concurrency``
+    segments are in flight or buffered at a time, so memory stays around
+    ``concurrency * segment_size`` whatever the file size.
+    """
+
+    live: "weakref.WeakSet[SegmentedMediaStream]" = weakref.WeakSet()
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        media_url: str,
+        first_response: aiohttp.ClientResponse,
+        start: int,
+        end: int,
+        total: int,
+        partial: bool,
+        segment_size: int,
+        concurrency: int,
+    ):
+        self.response = first_response
+        self.content_type = first_response.headers.get("Content-Type")
+        self.status = 206 if partial else 200
+        self.start, self.end, self.total = start, end, total
+        self.content_length = end - start + 1
+        self._session = session
+        self._media_url = media_url
+        self._concurrency = concurrency
+
+        first_end = min(start + segment_size - 1, end)
+        self._segments = [
+            (offset, min(offset + segment_size - 1, end))
+            for offset in range(first_end + 1, end + 1, segment_size)
+        ]
+        self._pending: deque = deque()
+        SegmentedMediaStream.live.add(self)
+
+    @property
+    def buffered(self) -> int:
+        """Bytes of downloaded segments waiting to be sent."""
+        return sum(
+            len(task.result())
+            for task in self._pending
+            if task.done() and not task.cancelled() and task.exception() is None
+        )
+
+    async def _fetch_segment(self, start: int, end: int) -> bytes:
+        headers = {"Range": f"bytes={start}-{end}"}
+        async with self._session.get(self._media_url, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.read()
+        if response.status != 206 or len(data) != end - start + 1:
+            raise aiohttp.ClientPayloadError(
+                f"Segment {start}-{end} came back as {response.status} with {len(data)} bytes"
+            )
+        return data
+
+    async def iter_chunks(self, chunk_size: int = MediaStream.CHUNK_SIZE):
+        segments = deque(self._segments)
+        pending = self._pending
+
+        def fill():
+            while segments and len(pending) < self._concurrency:
+                pending.append(asyncio.ensure_future(self._fetch_segment(*segments.popleft())))
+
+        try:
+            fill()
+            async for chunk in self.response.content.iter_chunked(chunk_size):
+                yield chunk
+            self.response.release()
+
+            while pending:
+                data = await pending.popleft()
+                fill()
+                for offset in range(0, len(data), chunk_size):
+                    yield data[offset:offset + chunk_size]
+        finally:
+            self.response.close()
+            for task in pending:
+                task.cancel()
+
+    def close(self):
+        super().close()
+        self._segments = []
+
+
+class ResumableMediaStream:
+    """
+    Keeps a MediaStream going across upstream failures.
+
+    Bytes already delivered are tracked; on a transient error (reset, early
+    EOF, timeout, 5xx) the remainder is requested again with a Range from the
+    same offset, after a jittered exponential backoff. ``reopen`` is expected
+    to re-extract on 403/410 so an expired signed URL is replaced, not retried.
+    The consumer sees one uninterrupted body.
+    """
+
+    TRANSIENT_ERRORS = (
+        aiohttp.ClientPayloadError,
+        aiohttp.ClientConnectionError,
+        aiohttp.ClientResponseError,
+        asyncio.TimeoutError,
+        ConnectionResetError,
+    )
+    RETRYABLE_STATUS = {403, 410, 429, 500, 502, 503, 504}
+
+    def __init__(self, media: MediaStream, reopen, max_retries: int, backoff_base: float, backoff_max: float):
+        self._media = media
+        self._reopen = reopen
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.content_type = media.content_type
+        self.status = media.status
+        self.start, self.end, self.total = media.start, media.end, media.total
+        self.content_length = media.content_length
+        self.retries = 0
+        self._current = media
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return self._media.headers
+
+    def _retryable(self, error: BaseException) -> bool:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in self.RETRYABLE_STATUS
+        return True
+
+    async def iter_chunks(self, chunk_size: int = MediaStream.CHUNK_SIZE):
+        media = self._media
+        offset = self.start or 0
+        end = self.end if self.status == 206 else None
+        remaining = self.content_length
+
+        while True:
+            try:
+                skip = 0
+                if media is None:
+                    media = self._current = await self._reopen((offset, end))
+                    skip = self._resume_skip(media, offset)
+                async with contextlib.aclosing(media.iter_chunks(chunk_size)) as chunks:
+                    async for chunk in chunks:
+                        if skip:
+                            # Upstream ignored the Range: drop what was already sent
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk, skip = chunk[skip:], 0
+                        offset += len(chunk)
+                        if remaining is not None:
+                            remaining -= len(chunk)
+                        yield chunk
+                if remaining:
+                    raise aiohttp.ClientPayloadError(
+                        f"Upstream closed with {remaining} bytes outstanding"
+                    )
+                return
+            except self.TRANSIENT_ERRORS as e:
+                media = None
+                if not self._retryable(e) or self.retries >= self.max_retries:
+                    raise
+                self.retries += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self.retries - 1))
+                delay *= random.uniform(0.5, 1.5)
+                logger.warning(
+                    "Upstream failed at byte %d (%s), resuming in %.1fs (retry %d/%d)",
+                    offset, e, delay, self.retries, self.max_retries,
+                )
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _resume_skip(media: MediaStream, offset: int) -> int:
+        """
+        Bytes to drop from a reopened response so it continues at ``offset``.
+        A 200 answer restarts at byte 0; a range that starts past ``offset``
+        can't be stitched and aborts the stream.
+        """
+        first = media.start if media.status == 206 and media.start is not None else 0
+        if first > offset:
+            media.close()
+            raise RuntimeError(f"Resumed upstream starts at byte {first}, expected {offset}")
+        if first < offset:
+            logger.warning("Upstream resumed at byte %d instead of %d, skipping ahead", first, offset)
+        return offset - first
+
+    def close(self):
+        self._current.close()
+
+
+class MediaBroadcast:
+    """
+    One upstream read shared by every concurrent full download of a media URL.
+
+    A single reader task fills a ring buffer holding the last ``window``
+    bytes. Subscribers read from it at their own pace; a new subscriber can
+    join from byte 0 only while byte 0 is still buffered. With several
+    subscribers the reader doesn't wait for any of them: one that falls out
+    of the window reopens the upstream from its own offset, carries on alone
+    and no longer counts as attached. With a single attached subscriber the
+    reader is paced to it instead, staying at most ``window`` bytes ahead,
+    and it is cancelled once nobody is attached.
+    """
+
+    live: "weakref.WeakSet[MediaBroadcast]" = weakref.WeakSet()
+
+    def __init__(
+        self, key: str, source: MediaStream, window: int, reopen, registry: Dict, stats: Dict
+    ):
+        self.key = key
+        self.source = source
+        self.window = window
+        self._reopen = reopen
+        self._registry = registry
+        self._chunks: deque = deque()
+        self._buffer_start = 0
+        self._produced = 0
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._reader: Optional[asyncio.Task] = None
+        self._offsets: Dict[object, int] = {}  # attached subscriber -> next byte it reads
+        self._unread_views = 0  # handed out but not iterated yet
+        self._stats = stats
+        MediaBroadcast.live.add(self)
+
+    @property
+    def buffered(self) -> int:
+        return self._produced - self._buffer_start
+
+    @property
+    def joinable(self) -> bool:
+        return self._buffer_start == 0 and self._error is None
+
+    def view(self) -> "_BroadcastView":
+        self._unread_views += 1
+        return _BroadcastView(self)
+
+    def _drop_view(self):
+        """A view was closed without being read; close the source if it was the last."""
+        self._unread_views -= 1
+        if self._unread_views == 0 and self._reader is None:
+            self._done = True
+            self.source.close()
+            if self._registry.get(self.key) is self:
+                del self._registry[self.key]
+
+    async def _read(self):
+        try:
+            async with contextlib.aclosing(self.source.iter_chunks()) as chunks:
+                async for chunk in chunks:
+                    self._chunks.append(chunk)
+                    self._produced += len(chunk)
+                    # A lone subscriber keeps every byte it hasn't read yet
+                    floor = self._pace_offset()
+                    while (
+                        self._produced - self._buffer_start > self.window
+                        and len(self._chunks) > 1
+                        and (floor is None or self._buffer_start + len(self._chunks[0]) <= floor)
+                    ):
+                        self._buffer_start += len(self._chunks.popleft())
+                    if self._buffer_start and self._registry.get(self.key) is self:
+                        del self._registry[self.key]  # byte 0 is gone, nobody else can join
+                    self._changed.set()
+                    self._changed = asyncio.Event()
+                    while self._lagging():
+                        self._drained = asyncio.Event()
+                        await self._drained.wait()
+        except BaseException as e:
+            self._error = e
+            raise
+        finally:
+            self._done = True
+            self._changed.set()
+            if self._registry.get(self.key) is self:
+                del self._registry[self.key]
+
+    def _pace_offset(self) -> Optional[int]:
+        """The offset of the only attached subscriber, or None if there are several."""
+        if len(self._offsets) != 1:
+            return None
+        return next(iter(self._offsets.values()))
+
+    def _lagging(self) -> bool:
+        floor = self._pace_offset()
+        return floor is not None and self._produced - floor >= self.window
+
+    def _detach(self, subscriber: object):
+        if self._offsets.pop(subscriber, None) is None:
+            return
+        self._drained.set()  # the reader may be paced to whoever is left
+        if not self._offsets and self._reader and not self._reader.done():
+            self._reader.cancel()  # nobody is reading from the buffer: stop reading upstream
+            if self._registry.get(self.key) is self:
+                del self._registry[self.key]
+
+    def _read_at(self, offset: int) -> bytes:
+        pos = self._buffer_start
+        for chunk in self._chunks:
+            if offset < pos + len(chunk):
+                return chunk[offset - pos:]
+            pos += len(chunk)
+        return b""
+
+    async def subscribe(self, view: "_BroadcastView"):
+        if not view.claimed:
+            view.claimed = True
+            self._unread_views -= 1
+        subscriber = object()
+        self._offsets[subscriber] = 0
+        if self._reader is None:
+            self._reader = asyncio.ensure_future(self._read())
+        offset = 0
+        try:
+            while True:
+                # The reader being cancelled (all earlier subscribers left) is not
+                # an upstream failure; whoever is still here continues privately.
+                abandoned = self._done and isinstance(self._error, asyncio.CancelledError)
+                if offset < self._buffer_start or (abandoned and offset >= self._produced):
+                    self._detach(subscriber)
+                    self._stats["fallbacks"] += 1
+                    logger.info("Broadcast subscriber detached at %d, reopening upstream", offset)
+                    media = await self._reopen(offset)
+                    async with contextlib.aclosing(media.iter_chunks()) as chunks:
+                        async for chunk in chunks:
+                            yield chunk
+                    return
+
+                if offset < self._produced:
+                    chunk = self._read_at(offset)
+                    offset += len(chunk)
+                    self._offsets[subscriber] = offset
+                    self._drained.set()
+                    yield chunk
+                    continue
+
+                if self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return
+
+                await self._changed.wait()
+        finally:
+            self._detach(subscriber)
+
+
+class _BroadcastView:
+    """A subscriber's MediaStream-shaped handle on a MediaBroadcast."""
+
+    def __init__(self, broadcast: MediaBroadcast):
+        self._broadcast = broadcast
+        self.claimed = False  # by a reader, or given back by close()
+        source = broadcast.source
+        self.content_type = source.content_type
+        self.status = source.status
+        self.start, self.end, self.total = source.start, source.end, source.total
+        self.content_length = source.content_length
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return self._broadcast.source.headers
+
+    def iter_chunks(self, chunk_size: int = MediaStream.CHUNK_SIZE):
+        return self._broadcast.subscribe(self)
+
+    def close(self):
+        # Once reading, closing the iterator detaches; until then the view holds the source
+        if not self.claimed:
+            self.claimed = True
+            self._broadcast._drop_view()
+
+
+class CachedMedia:
+    """A media cache hit: the whole file is already on local disk."""
+
+    READ_SIZE = 1024 * 1024
+
+    def __init__(
+        self, path: str, size: int, start_byte: int = 0, ext: str = None, content_type: str = None
+    ):
+        self.path = path
+        self.size = size
+        self.start_byte = start_byte
+        self.ext = ext
+        self.content_type = content_type
+
+    async def iter_chunks(self, chunk_size: int = READ_SIZE):
+        with open(self.path, "rb") as f:
+            f.seek(self.start_byte)
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def close(self):
+        pass  # the file is only open while iter_chunks runs
+
+
+media_cache = MediaCache(
+    root=Config.MEDIA_CACHE_PATH,
+    max_bytes=Config.MEDIA_CACHE_MAX_BYTES,
+    enabled=Config.MEDIA_CACHE_ENABLED,
+)
+
+
+format_availability = FormatAvailability(
+    ttl=Config.UNAVAILABLE_TTL,
+    max_entries=Config.UNAVAILABLE_MAX_ENTRIES,
+    min_samples=Config.FORMAT_STATS_MIN_SAMPLES,
+    bad_rate=Config.FORMAT_STATS_BAD_RATE,
+)
+
+
+ffmpeg_pool = FfmpegPool(
+    max_processes=Config.FFMPEG_MAX_PROCESSES,
+    max_waiting=Config.FFMPEG_MAX_WAITING,
+    wait_timeout=Config.FFMPEG_WAIT_TIMEOUT,
+)
+
+
+transcode_pool = FfmpegPool(
+    max_processes=Config.TRANSCODE_MAX_PROCESSES,
+    max_waiting=Config.TRANSCODE_MAX_WAITING,
+    wait_timeout=Config.FFMPEG_WAIT_TIMEOUT,
+)
+
+
+transcode_cache = MediaCache(
+    root=Config.TRANSCODE_CACHE_PATH,
+    max_bytes=Config.TRANSCODE_CACHE_MAX_BYTES,
+    enabled=Config.TRANSCODE_CACHE_ENABLED,
+)
+
+
+def buffered_media_bytes() -> int:
+    """Media currently held in memory by broadcast windows and prefetched segments."""
+    return sum(b.buffered for b in list(MediaBroadcast.live)) + sum(
+        m.buffered for m in list(SegmentedMediaStream.live)
+    )
+
+
+admission = AdmissionController(
+    max_streams=Config.ADMISSION_MAX_STREAMS,
+    max_waiting=Config.ADMISSION_MAX_WAITING,
+    wait_timeout=Config.ADMISSION_WAIT_TIMEOUT,
+    max_pending_extractions=Config.ADMISSION_MAX_PENDING_EXTRACTIONS,
+    max_buffered_bytes=Config.ADMISSION_MAX_BUFFERED_MB * 1024 * 1024,
+    retry_after=Config.ADMISSION_RETRY_AFTER,
+    pending_extractions=lambda: extraction_pool.queue_depth,
+    buffered_bytes=buffered_media_bytes,
+)
+
+bandwidth = BandwidthScheduler(
+    global_rate=Config.BANDWIDTH_GLOBAL_KBPS * 1024,
+    user_rate=Config.BANDWIDTH_USER_KBPS * 1024,
+    burst=Config.BANDWIDTH_BURST_MB * 1024 * 1024,
+)
+
+
+class _PipedMedia:
+    """
+    Media produced on the fly by an ffmpeg pipe.
+
+    Nothing touches disk and the length isn't known up front, so it is
+    always a plain 200 without ranges.
+    """
+
+    def __init__(self, ext: str, content_type: str):
+        self.ext = ext
+        self.content_type = content_type
+        self.status = 200
+        self.start = self.end = self.total = None
+        self.content_length = None
+        self.headers = {"Accept-Ranges": "none"}
+
+
+class MuxedMedia(_PipedMedia):
+    """A video-only and an audio-only stream muxed into fragmented MP4 (or WebM for VP9/Opus pairs)."""
+
+    FFMPEG_ARGS = {
+        "webm": ["-f", "webm"],
+        "mp4": ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov+default_base_moof"],
+    }
+
+    def __init__(self, video: MediaStream, audio: MediaStream, container: str):
+        super().__init__(container, f"video/{container}")
+        self._video = video
+        self._audio = audio
+
+    def iter_chunks(self, chunk_size: int = MediaStream.CHUNK_SIZE):
+        args = [
+            "-i", "{input0}",
+            "-i", "{input1}",
+            "-map", "0:v:0",
+            "-map", "1:a:0",
+            "-c", "copy",
+            *self.FFMPEG_ARGS[self.ext],
+            "pipe:1",
+        ]
+        return ffmpeg_pool.run(args, [self._video.iter_chunks(), self._audio.iter_chunks()])
+
+    def close(self):
+        self._video.close()
+        self._audio.close()
+
+
+# Output formats of the audio endpoint. ``copy`` lists source codecs that can
+# be remuxed as-is instead of re-encoded.
+AUDIO_OUTPUTS = {
+    "mp3": {
+        "content_type": "audio/mpeg",
+        "encoder": "libmp3lame",
+        "args": ["-f", "mp3"],
+        "copy": ("mp3",),
+    },
+    "m4a": {
+        "content_type": "audio/mp4",
+        "encoder": "aac",
+        "args": ["-f", "mp4", "-movflags", "empty_moov+default_base_moof", "-frag_duration", "1000000"],
+        "copy": ("mp4a", "aac"),
+    },
+    "webm": {
+        "content_type": "audio/webm",
+        "encoder": "libopus",
+        "args": ["-f", "webm"],
+        "copy": ("opus", "vorbis"),
+    },
+}
+
+AUDIO_BITRATES = (64, 96, 128, 160, 192, 256, 320)
+
+
+class TranscodedMedia(_PipedMedia):
+    """The audio track of a source stream, remuxed or re-encoded by ffmpeg."""
+
+    def __init__(self, source: MediaStream, ext: str, bitrate: Optional[int]):
+        super().__init__(ext, AUDIO_OUTPUTS[ext]["content_type"])
+        self._source = source
+        self.bitrate = bitrate  # None: stream copy
+
+    def iter_chunks(self, chunk_size: int = MediaStream.CHUNK_SIZE):
+        output = AUDIO_OUTPUTS[self.ext]
+        if self.bitrate is None:
+            codec = ["-c:a", "copy"]
+        else:
+            codec = ["-c:a", output["encoder"], "-b:a", f"{self.bitrate}k"]
+        args = [
+            "-i", "{input0}",
+            "-vn",
+            "-map", "0:a:0",
+            *codec,
+            *output["args"],
+            "pipe:1",
+        ]
+        return transcode_pool.run(args, [self._source.iter_chunks()])
+
+    def close(self):
+        self._source.close()
+
+
 class StreamDownloader:
+    YOUTUBE_OPTS = {
+        "noplaylist": True,
+        "quiet": True,
+    }
+    BEST_OPTS = {
+        "format": "best",
+        "quiet": True,
+    }
+
+    broadcasts: Dict[str, MediaBroadcast] = {}
+    broadcast_stats = {"started": 0, "joined": 0, "fallbacks": 0}
+
     def __init__(self):
         self.platform_handlers = {
             "youtube": self._handle_youtube,
-            "youtu.be": self._handle_youtube,
             "instagram": self._handle_instagram,
             "tiktok": self._handle_tiktok,
             "facebook": self._handle_facebook,
-            "fb.watch": self._handle_facebook,
             "twitter": self._handle_twitter,
-            "x.com": self._handle_twitter,
         }
 
+    async def open_stream(
+        self,
+        url: str,
+        itag: str = "best",
+        byte_range: Optional[ByteRange] = None,
+        start_byte: int = 0,
+        token: str = None,
+    ) -> Union[MediaStream, CachedMedia]:
+        """
+        Resolve the media for ``url`` and open the upstream response.
+
+        ``byte_range`` (from a Range header) wins over the legacy ``start_byte``
+        resume offset. Failures raise instead of being written into the body.
+        With the media cache enabled, a cached file is returned as
+        ``CachedMedia`` instead, and full-body misses are written to the cache.
+        """
+        platform = self._identify_platform(url)
+        handler = self.platform_handlers.get(platform)
+
+        if not handler:
+            raise UnsupportedPlatformError(f"Unsupported platform: {url}")
+
+        key = await self._media_key(platform, url, itag) if media_cache.enabled else None
+        if key:
+            hit = media_cache.lookup(key)
+            if hit:
+                return CachedMedia(*hit, start_byte=start_byte if byte_range is None else 0)
+
+        if byte_range is None and start_byte:
+            byte_range = (start_byte, None)
+
+        media = await handler(url, itag, byte_range, [], token=token)
+        if key and byte_range is None:
+            served = getattr(media, "itag", None)
+            if served and served != key[2]:
+                # A fallback itag was served; cache it as what it is
+                key = (key[0], key[1], served)
+            media = media_cache.tee(key, media)
+        return media
+
+    async def open_muxed(self, url: str, itag: str, token: str = None):
+        """
+        Open a YouTube video-only itag together with the best matching audio
+        itag and mux them server-side, so high resolutions come with sound.
+
+        Itags that already carry sound (progressive formats, "best", audio
+        itags) need no muxing and go through ``open_stream`` as usual.
+        """
+        if itag == "best" or itag in audio_formats:
+            return await self.open_stream(url, itag=itag, token=token)
+
+        info = await extract_info(url, self.YOUTUBE_OPTS)
+        available = {
+            fmt.get("format_id"): fmt
+            for fmt in info.get("formats", [])
+            if fmt.get("url")
+        }
+
+        media_id = info.get("id")
+        video = next(
+            (
+                available[trial_itag]
+                for trial_itag, _ in format_availability.prefer_good(
+                    "youtube", self._youtube_fallback_ladder(itag)
+                )
+                if trial_itag in available
+                and not format_availability.is_unavailable("youtube", media_id, trial_itag)
+            ),
+            None,
+        )
+        if video is None:
+            raise ValueError("Requested format not available")
+        if video.get("acodec") not in (None, "none") or video.get("vcodec") in (None, "none"):
+            # Already has sound (or is sound only): nothing to mux
+            return await self.open_stream(url, itag=itag, token=token)
+        if video["format_id"] != itag:
+            await self._notify(
+                token, f"Requested format not available ,retrying with {video['format_id']}"
+            )
+
+        ffmpeg_pool.check_available()
+        webm = video.get("ext") == "webm"
+        audio_order = ["251", "250", "249"] if webm else ["140"]
+        audio = next(
+            (available[a] for a in audio_order + audio_formats if a in available), None
+        )
+        if audio is None:
+            raise ValueError("No audio format available to mux with")
+
+        container = "webm" if webm and audio.get("ext") == "webm" else "mp4"
+
+        def open_format(fmt):
+            format_id = fmt["format_id"]
+            return self._open_url(
+                fmt["url"],
+                None,
+                fmt.get("filesize") or parse_clen(fmt["url"]),
+                refresh=lambda: self._refresh_url(url, self.YOUTUBE_OPTS, format_id),
+                platform="youtube",
+            )
+
+        opens = [asyncio.ensure_future(open_format(fmt)) for fmt in (video, audio)]
+        try:
+            video_media, audio_media = await asyncio.gather(*opens)
+        except BaseException:
+            # Don't leak the side that did open (or is still opening)
+            for task in opens:
+                task.cancel()
+            await asyncio.gather(*opens, return_exceptions=True)
+            for task in opens:
+                if not task.cancelled() and task.exception() is None:
+                    task.result().close()
+            raise
+        logger.info(
+            "Muxing itag %s + %s into %s for %s",
+            video["format_id"], audio["format_id"], container, url,
+        )
+        return MuxedMedia(video_media, audio_media, container)
+
+    async def open_audio(
+        self, url: str, audio_format: str = "mp3", bitrate: int = 192
+    ) -> Union[TranscodedMedia, CachedMedia]:
+        """
+        Open the best audio source for ``url`` and pipe it through ffmpeg.
+
+        The source codec is copied when the output container can hold it
+        (``original`` always copies when possible); otherwise it is encoded at
+        ``bitrate`` kbps. Finished transcodes are cached by media id, output
+        and bitrate.
+        """
+        platform = self._identify_platform(url)
+        if platform not in self.platform_handlers:
+            raise UnsupportedPlatformError(f"Unsupported platform: {url}")
+        if audio_format != "original" and audio_format not in AUDIO_OUTPUTS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+
+        opts = self._opts_for(platform)
+        info = await extract_info(url, opts)
+
+        source = self._best_audio_source(info, audio_format)
+        if source is None:
+            raise ValueError("No audio stream found")
+
+        acodec = (source.get("acodec") or "").split(".")[0]
+        if audio_format == "original":
+            ext = next(
+                (name for name, output in AUDIO_OUTPUTS.items() if acodec in output["copy"]),
+                "mp3",
+            )
+        else:
+            ext = audio_format
+        copy = acodec in AUDIO_OUTPUTS[ext]["copy"]
+        if copy and audio_format != "original" and source.get("abr") and source["abr"] > bitrate * 1.1:
+            # Re-encode down when the client asked for a lower bitrate
+            copy = False
+        out_bitrate = None if copy else bitrate
+
+        _, ref = await resolve_media_url(url)
+        media_id = ref.media_id if ref else info.get("id")
+        key = None
+        if media_id:
+            key = (platform, str(media_id), f"audio-{ext}-{out_bitrate or 'copy'}")
+            hit = transcode_cache.lookup(key)
+            if hit:
+                return CachedMedia(*hit, ext=ext, content_type=AUDIO_OUTPUTS[ext]["content_type"])
+
+        transcode_pool.check_available()
+
+        format_id = source.get("format_id") if source is not info else None
+        media = await self._open_url(
+            source["url"],
+            None,
+            source.get("filesize") or parse_clen(source["url"]),
+            refresh=lambda: self._refresh_url(url, opts, format_id),
+            platform=platform,
+        )
+        logger.info(
+            "Extracting audio from %s (%s) as %s, %s",
+            url, source.get("format_id"), ext, f"{out_bitrate}k" if out_bitrate else "copy",
+        )
+        transcoded = TranscodedMedia(media, ext, out_bitrate)
+        if key:
+            return transcode_cache.tee(key, transcoded, sized=False)
+        return transcoded
+
+    @staticmethod
+    def _best_audio_source(info: Dict, audio_format: str) -> Optional[Dict]:
+        """
+        Highest-bitrate audio-only format, preferring ones the requested
+        output can copy; falls back to the muxed "best" format.
+        """
+        copyable = AUDIO_OUTPUTS.get(audio_format, {}).get("copy", ())
+        audio_only = [
+            fmt
+            for fmt in info.get("formats") or []
+            if fmt.get("url")
+            and fmt.get("vcodec") == "none"
+            and fmt.get("acodec") not in (None, "none")
+        ]
+        if audio_only:
+            return max(
+                audio_only,
+                key=lambda fmt: (
+                    (fmt.get("acodec") or "").split(".")[0] in copyable,
+                    fmt.get("abr") or fmt.get("tbr") or 0,
+                ),
+            )
+        if info.get("url") and info.get("acodec") != "none":
+            return info
+        return None
+
+    async def _media_key(self, platform: str, url: str, itag: str) -> Optional[Tuple[str, str, str]]:
+        """
+        (platform, media id, itag) for the media cache. Canonical URLs are
+        keyed without extracting; anything else falls back to the id from the
+        handler's cached extraction.
+        """
+        itag = itag if platform == "youtube" else "best"
+        _, ref = await resolve_media_url(url)
+        if ref is not None:
+            return ref.platform, ref.media_id, itag
+        try:
+            info = await extract_info(url, self._opts_for(platform))
+        except Exception as e:
+            logger.debug("No media cache key for %s: %s", url, e)
+            return None
+        if not info or not info.get("id"):
+            return None
+        return platform, str(info["id"]), itag
+
     async def download_stream(
         self, url: str, itag: str = "best", start_byte: int = 0, token: str = None
     ):
         """
         Universal streaming downloader for multiple platforms
         """
-        try:
-            platform = self._identify_platform(url)
-            handler = self.platform_handlers.get(platform)
+        media = await self.open_stream(url, itag, start_byte=start_byte, token=token)
+        async with contextlib.aclosing(media.iter_chunks()) as chunks:
+            async for chunk in chunks:
+                yield chunk
 
-            if not handler:
-                raise UnsupportedPlatformError(f"Unsupported platform: {url}")
+    ARCHIVE_EXTENSIONS = {
+        "video/mp4": "mp4",
+        "audio/mp4": "m4a",
+        "video/webm": "webm",
+        "audio/webm": "webm",
+        "audio/mpeg": "mp3",
+    }
 
-            async for chunk in handler(url, itag, start_byte, [], token=token):
-                yield chunk
+    async def playlist_archive(
+        self, playlist_url: str, itag: str = "best"
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Stream every entry of a playlist as one stored ZIP archive.
 
-        except Exception as e:
-            logger.exception(f"Error streaming video: {str(e)}")
-            yield f"[ERROR]{str(e)}".encode()
+        Entries are taken from the (progressively filled) playlist listing;
+        the next ``ARCHIVE_LOOKAHEAD`` entries are extracted while the current
+        one streams, so each entry starts without waiting on yt-dlp. Entries
+        that can't be downloaded are listed in ``_failed.txt`` at the end; an
+        entry cut short mid-stream also gets a ``<name>.failed.txt`` marker.
+        """
+        listing = playlist_listings.get(playlist_url)
+        archive = ZipStream()
+        ahead: deque = deque()  # (index, song, extraction task)
+        failed: List[str] = []
+
+        async def songs():
+            index = 0
+            async for _, page in listing.read():
+                for song in page:
+                    index += 1
+                    yield index, song
+
+        pending = songs()
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(ahead) <= Config.ARCHIVE_LOOKAHEAD:
+                    try:
+                        index, song = await pending.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(self.prefetch_info(song["url"]))
+                    ahead.append((index, song, task))
+                if not ahead:
+                    break
+
+                index, song, task = ahead.popleft()
+                title = song.get("title") or song.get("id") or f"track {index}"
+                try:
+                    await task
+                    media = await self.open_stream(song["url"], itag)
+                except Exception as e:
+                    logger.warning("Skipping %s in archive: %s", song.get("url"), e)
+                    failed.append(f"{index:03d} {title}: {e}")
+                    continue
+
+                name = f"{index:03d} - {self._safe_filename(title)}.{self._archive_ext(media, itag)}"
+                try:
+                    async with contextlib.aclosing(media.iter_chunks()) as chunks:
+                        async with contextlib.aclosing(archive.add(name, chunks)) as entry:
+                            async for chunk in entry:
+                                yield chunk
+                except Exception as e:
+                    # Upstream or a mid-entry URL refresh failed. The entry is
+                    # closed at the bytes already sent, so it is short; a marker
+                    # next to it says so where the user will see it.
+                    logger.warning("Entry %s truncated in archive: %s", name, e)
+                    failed.append(f"{index:03d} {title}: truncated ({e})")
+                    media.close()
+                    marker = self._lines([f"{name} is incomplete: {e}"])
+                    async for chunk in archive.add(f"{name}.failed.txt", marker):
+                        yield chunk
+
+            if listing.error and not len(archive):
+                raise RuntimeError(f"Failed to fetch playlist: {listing.error}")
+            if listing.error:
+                failed.append(f"Playlist listing is incomplete: {listing.error}")
+            if failed:
+                async for chunk in archive.add("_failed.txt", self._lines(failed)):
+                    yield chunk
+            yield archive.finish()
+        finally:
+            for _, _, task in ahead:
+                task.cancel()
+            await pending.aclose()
+
+    async def prefetch_info(self, url: str, priority: int = PRIORITY_DOWNLOAD):
+        """Warm the extraction cache for ``url`` with the options its handler uses."""
+        await extract_info(url, self._opts_for(self._identify_platform(url)), priority)
+
+    def _opts_for(self, platform: str) -> Dict:
+        return self.YOUTUBE_OPTS if platform == "youtube" else self.BEST_OPTS
+
+    def _archive_ext(self, media, itag: str) -> str:
+        content_type = (getattr(media, "content_type", None) or "").split(";")[0].strip()
+        if content_type in self.ARCHIVE_EXTENSIONS:
+            return self.ARCHIVE_EXTENSIONS[content_type]
+        if itag == "140":
+            return "m4a"
+        return "webm" if itag in audio_formats else "mp4"
+
+    @staticmethod
+    def _safe_filename(title: str) -> str:
+        return re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", title).strip()[:150] or "untitled"
+
+    @staticmethod
+    async def _lines(lines: List[str]):
+        yield ("\n".join(lines) + "\n").encode()
 
     def _identify_platform(self, url: str) -> str:
         """Identify the platform from the URL"""
-        domain = urlparse(url).netloc.lower()
-        if "youtube" in domain or "youtu.be" in domain:
-            return "youtube"
-        elif "instagram" in domain:
-            return "instagram"
-        elif "tiktok" in domain:
-            return "tiktok"
-        elif "facebook" in domain or "fb.watch" in domain:
-            return "facebook"
-        elif "twitter" in domain or "x.com" in domain:
-            return "twitter"
-        return "unknown"
+        return platform_for_url(url) or "unknown"
+
+    @staticmethod
+    def _youtube_fallback_ladder(itag: str) -> List[Tuple[str, Optional[int]]]:
+        """
+        Ordered (itag, resolution) candidates for a requested itag: the itag
+        itself, then the other audio itags, or the other itags of the same
+        resolution followed by every lower resolution step.
+        """
+        if itag in audio_formats:
+            return [(itag, None)] + [(a, None) for a in audio_formats if a != itag]
+
+        current_res = next(
+            (res for res, formats in video_formats.items() if itag in formats), None
+        )
+        if current_res is None:
+            return [(itag, None)]
+
+        ladder = [(itag, current_res)]
+        for res in sorted((r for r in video_formats if r <= current_res), reverse=True):
+            ladder.extend((f, res) for f in video_formats[res] if f != itag)
+        return ladder
+
+    @staticmethod
+    def _best_progressive_format(formats: List[Dict]) -> Optional[Dict]:
+        """Best format carrying both audio and video, for itag="best"."""
+        muxed = [
+            f
+            for f in formats
+            if f.get("url")
+            and f.get("vcodec") not in (None, "none")
+            and f.get("acodec") not in (None, "none")
+        ]
+        return max(
+            muxed, key=lambda f: (f.get("height") or 0, f.get("tbr") or 0), default=None
+        )
+
+    async def _notify(self, token, message: str):
+        from app import notifications_namespace
+
+        await notifications_namespace.trigger_notification({
+            "room": str(token),
+            "message": message,
+            "messageType": "error",
+        })
 
     async def _handle_youtube(
-        self, url: str, itag: str, start_byte: int, failed_itags=None, token=None
-    ):
-        if not isinstance(failed_itags, list):
-            failed_itags = []
+        self, url: str, itag: str, byte_range: Optional[ByteRange], failed_itags=None, token=None
+    ) -> MediaStream:
+        """
+        YouTube streaming handler.
+
+        One extraction yields every available format, so fallback down the
+        audio / resolution ladder is resolved in memory instead of re-running
+        yt-dlp once per candidate itag.
+        """
+        failed_itags = list(failed_itags) if isinstance(failed_itags, list) else []
 
-        if failed_itags is None:
-            failed_itags = []
         try:
-            """YouTube streaming handler"""
-            ydl_opts = {
-                "format": itag,
-                "noplaylist": True,
-                "quiet": True,
-                "extract_flat": False,
+            info = await extract_info(url, self.YOUTUBE_OPTS)
+            media_id = info.get("id")
+            available = {
+                fmt.get("format_id"): fmt
+                for fmt in info.get("formats", [])
+                if fmt.get("url")
             }
 
-            loop = asyncio.get_event_loop()
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = await loop.run_in_executor(
-                    None, lambda: ydl.extract_info(url, download=False)
-                )
-                video_url = next(
-                    (
-                        fmt["url"]
-                        for fmt in info.get("formats", [])
-                        if fmt.get("format_id") == itag
-                    ),
-                    None,
-                )
-
-                if not video_url:
-                    raise ValueError("Requested format not available")
-
-                async for chunk in self._stream_from_url(video_url, start_byte):
-                    yield chunk
+            if itag == "best" and "best" not in available:
+                best = self._best_progressive_format(info.get("formats", []))
+                if best:
+                    available["best"] = best
 
-        except Exception as e:
-            from app import notifications_namespace
-
-            if "Requested format is not available" in str(e):
-                logger.error("YouTube streaming failed for itag %s: %s", itag, str(e))
-
-                failed_itags.append(itag)
-
-                # AUDIO FALLBACK
-                if itag in audio_formats:
-                    for trial_itag in audio_formats:
-                        if trial_itag not in failed_itags:
-                            logger.info("Retrying with audio itag %s", trial_itag)
-                            await notifications_namespace.trigger_notification({
-                                "room": str(token),
-                                "message": f"Requested format not available ,retrying with audio itag {trial_itag}",
-                                "messageType": "error",
-                            })
-                            async for chunk in self._handle_youtube(
-                                url, trial_itag, start_byte, failed_itags, token
-                            ):
-                                yield chunk
-                            return
-
-                # VIDEO FALLBACK WITH RESOLUTION STEP-DOWN
-                else:
-                    # Find current resolution
-                    current_res = None
-                    for res, formats in video_formats.items():
-                        if itag in formats:
-                            current_res = res
-                            break
-
-                    if current_res is not None:
-                        # Create list of resolutions from current downwards
-                        resolutions_to_try = sorted(
-                            [r for r in video_formats.keys() if r <= current_res],
-                            reverse=True,
+            ladder = format_availability.prefer_good(
+                "youtube", self._youtube_fallback_ladder(itag)
+            )
+            last_res = ladder[0][1]
+            for trial_itag, res in ladder:
+                if trial_itag in failed_itags:
+                    continue
+                if format_availability.is_unavailable("youtube", media_id, trial_itag):
+                    # Already known not to work for this video; skip without notifying
+                    failed_itags.append(trial_itag)
+                    continue
+
+                fmt = available.get(trial_itag)
+                if not fmt:
+                    format_availability.record("youtube", media_id, trial_itag, availability.MISSING)
+                    failed_itags.append(trial_itag)
+                    continue
+
+                if trial_itag != itag:
+                    if res is not None and res < last_res:
+                        logger.info("Stepping down to %sp fallback", res)
+                        await self._notify(
+                            token, f"Requested format not available, Stepping down to {res}"
                         )
+                    logger.info("Falling back to itag %s (%s)", trial_itag, res or "audio")
+                    await self._notify(
+                        token,
+                        f"Requested format not available ,retrying with {res or 'audio itag'} {trial_itag}",
+                    )
+                last_res = res
+
+                format_id = fmt.get("format_id")
+                try:
+                    media = await self._open_url(
+                        fmt["url"],
+                        byte_range,
+                        fmt.get("filesize") or parse_clen(fmt["url"]),
+                        refresh=lambda: self._refresh_url(url, self.YOUTUBE_OPTS, format_id),
+                        platform="youtube",
+                    )
+                    format_availability.record("youtube", media_id, trial_itag, availability.SERVED)
+                    media.itag = trial_itag
+                    return media
+                except (RangeNotSatisfiable, CircuitOpen):
+                    raise
+                except Exception as open_err:
+                    format_availability.record(
+                        "youtube", media_id, trial_itag, self._open_outcome(open_err)
+                    )
+                    logger.error("Failed with itag %s: %s", trial_itag, open_err)
+                    await self._notify(token, f"Download faled with {trial_itag} {res or ''}".rstrip())
+                    failed_itags.append(trial_itag)
+
+            logger.error("All fallback formats failed for %s (tried %s)", url, failed_itags)
+            await self._notify(
+                token, f"Download faled!!, All fallback formats failed for {url}"
+            )
+            raise ValueError("Requested format not available")
 
-                        for res in resolutions_to_try:
-                            # If we're stepping to a lower resolution, skip remaining formats of previous one
-                            if res < current_res:
-                                logger.info("Stepping down to %sp fallback", res)
-                                await notifications_namespace.trigger_notification({
-                                    "room": str(token),
-                                    "message": f"Requested format not available, Stepping down to {res}",
-                                    "messageType": "error",
-                                })
-                            for trial_itag in video_formats[res]:
-                                if trial_itag in failed_itags:
-                                    continue
-
-                                logger.info(
-                                    "Retrying with %sp (itag %s)", res, trial_itag
-                                )
-                                await notifications_namespace.trigger_notification({
-                                    "room": str(token),
-                                    "message": f"Requested format not available ,retrying with {res} {trial_itag}",
-                                    "messageType": "error",
-                                })
-                                try:
-                                    async for chunk in self._handle_youtube(
-                                        url, trial_itag, start_byte, failed_itags, token
-                                    ):
-                                        yield chunk
-                                    return  # Success
-
-                                except Exception as retry_err:
-                                    await notifications_namespace.trigger_notification({
-                                        "room": str(token),
-                                        "message": f"Download faled with {trial_itag} {res}",
-                                        "messageType": "error",
-                                    })
-                                    logger.error(
-                                        "Failed with itag %s (%sp): %s",
-                                        trial_itag,
-                                        res,
-                                        retry_err,
-                                    )
-                                    failed_itags.append(trial_itag)
-
-                logger.error("All fallback formats failed for %s", url)
-                await notifications_namespace.trigger_notification({
-                    "room": str(token),
-                    "message": f"Download faled!!, All fallback formats failed for {url}",
-                    "messageType": "error",
-                })
-
-            else:
-                logger.error("Streaming YouTube failed: %s", str(e))
-                await notifications_namespace.trigger_notification({
-                    "room": str(token),
-                    "message": f"Download failed{str(e)[:30]}",
-                    "messageType": "error",
-                })
+        except (RangeNotSatisfiable, CircuitOpen):
+            raise
+        except Exception as e:
+            logger.error("Streaming YouTube failed: %s", str(e))
+            await self._notify(token, f"Download failed{str(e)[:30]}")
+            raise
 
     async def _handle_instagram(
-        self, url: str, itag: str, start_byte: int, ailed_itags=None, token=None
-    ):
+        self, url: str, itag: str, byte_range: Optional[ByteRange], failed_itags=None, token=None
+    ) -> MediaStream:
         """Instagram streaming handler"""
-        ydl_opts = {
-            "format": "best",
-            "quiet": True,
-        }
-
-        loop = asyncio.get_event_loop()
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await loop.run_in_executor(
-                None, lambda: ydl.extract_info(url, download=False)
-            )
-
-            if not info.get("url"):
-                raise ValueError("No stream URL found for Instagram post")
-
-            async for chunk in self._stream_from_url(info["url"], start_byte):
-                yield chunk
+        return await self._open_best(url, byte_range, "Instagram post")
 
     async def _handle_tiktok(
-        self, url: str, itag: str, start_byte: int, ailed_itags=None, token=None
-    ):
+        self, url: str, itag: str, byte_range: Optional[ByteRange], failed_itags=None, token=None
+    ) -> MediaStream:
         """TikTok streaming handler"""
-        ydl_opts = {
-            "format": "best",
-            "quiet": True,
-        }
+        return await self._open_best(url, byte_range, "TikTok video")
 
-        loop = asyncio.get_event_loop()
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await loop.run_in_executor(
-                None, lambda: ydl.extract_info(url, download=False)
-            )
+    async def _handle_facebook(
+        self, url: str, itag: str, byte_range: Optional[ByteRange], failed_itags=None, token=None
+    ) -> MediaStream:
+        """Facebook streaming handler"""
+        return await self._open_best(url, byte_range, "Facebook video")
 
-            if not info.get("url"):
-                raise ValueError("No stream URL found for TikTok video")
+    async def _handle_twitter(
+        self, url: str, itag: str, byte_range: Optional[ByteRange], failed_itags=None, token=None
+    ) -> MediaStream:
+        """Twitter/X streaming handler"""
+        return await self._open_best(url, byte_range, "Twitter video")
 
-            async for chunk in self._stream_from_url(info["url"], start_byte):
-                yield chunk
+    async def _open_best(
+        self, url: str, byte_range: Optional[ByteRange], label: str
+    ) -> MediaStream:
+        """Open yt-dlp's single "best" format, as used by every non-YouTube platform."""
+        info = await extract_info(url, self.BEST_OPTS)
 
-    async def _handle_facebook(
-        self, url: str, itag: str, start_byte: int, ailed_itags=None, token=None
-    ):
-        """Facebook streaming handler"""
-        ydl_opts = {
-            "format": "best",
-            "quiet": True,
-        }
+        if not info.get("url"):
+            raise ValueError(f"No stream URL found for {label}")
 
-        loop = asyncio.get_event_loop()
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await loop.run_in_executor(
-                None, lambda: ydl.extract_info(url, download=False)
+        # Only one candidate here, so outcomes feed the per-platform stats alone
+        platform = self._identify_platform(url)
+        format_id = info.get("format_id") or "best"
+        try:
+            media = await self._open_url(
+                info["url"],
+                byte_range,
+                info.get("filesize") or parse_clen(info["url"]),
+                refresh=lambda: self._refresh_url(url, self.BEST_OPTS),
+                platform=platform,
             )
+        except (RangeNotSatisfiable, CircuitOpen):
+            raise
+        except Exception as e:
+            format_availability.record(platform, None, format_id, self._open_outcome(e))
+            raise
+        format_availability.record(platform, None, format_id, availability.SERVED)
+        return media
 
-            if not info.get("url"):
-                raise ValueError("No stream URL found for Facebook video")
+    @staticmethod
+    def _open_outcome(error: BaseException) -> str:
+        """
+        Whether a failed open says the format itself can't be served. Only
+        a refusal that survived the URL refresh does; resets, timeouts and
+        5xx are transient and must not put the format in the negative cache.
+        """
+        if isinstance(error, aiohttp.ClientResponseError) and error.status in (403, 404, 410):
+            return availability.FAILED
+        if isinstance(error, ValueError):  # the refresh no longer offers the format
+            return availability.FAILED
+        return availability.TRANSIENT
+
+    async def _refresh_url(self, url: str, ydl_opts: Dict, format_id: str = None) -> str:
+        """Re-extract bypassing the cache and return a newly signed media URL."""
+        info = await extract_info(url, ydl_opts, fresh=True)
+        if format_id is None:
+            media_url = info.get("url")
+        else:
+            media_url = next(
+                (
+                    fmt.get("url")
+                    for fmt in info.get("formats", [])
+                    if fmt.get("format_id") == format_id
+                ),
+                None,
+            )
+        if not media_url:
+            raise ValueError("Media is no longer available")
+        return media_url
+
+    async def _open_url(
+        self,
+        media_url: str,
+        byte_range: Optional[ByteRange] = None,
+        size_hint: Optional[int] = None,
+        refresh=None,
+        platform: Optional[str] = None,
+    ) -> MediaStream:
+        """
+        Open a direct media URL, sharing one upstream read between concurrent
+        full downloads of the same URL (see ``MediaBroadcast``).
 
-            async for chunk in self._stream_from_url(info["url"], start_byte):
-                yield chunk
+        ``refresh`` is an async callable returning a newly signed URL for the
+        same media, used when the CDN rejects the current one. Opening counts
+        against ``platform``'s circuit breaker when given.
+        """
+        if byte_range is not None or not Config.BROADCAST_ENABLED:
+            return await self._open_upstream(media_url, byte_range, size_hint, refresh, platform)
+
+        broadcast = self.broadcasts.get(media_url)
+        if broadcast is not None and broadcast.joinable:
+            self.broadcast_stats["joined"] += 1
+            return broadcast.view()
+
+        media = await self._open_upstream(media_url, None, size_hint, refresh, platform)
+        broadcast = MediaBroadcast(
+            media_url,
+            media,
+            Config.BROADCAST_WINDOW,
+            reopen=lambda offset: self._open_upstream(
+                media_url, (offset, None), size_hint, refresh
+            ),
+            registry=self.broadcasts,
+            stats=self.broadcast_stats,
+        )
+        self.broadcasts[media_url] = broadcast
+        self.broadcast_stats["started"] += 1
+        return broadcast.view()
+
+    async def _open_upstream(
+        self,
+        media_url: str,
+        byte_range: Optional[ByteRange] = None,
+        size_hint: Optional[int] = None,
+        refresh=None,
+        platform: Optional[str] = None,
+    ) -> MediaStream:
+        """
+        Open a media URL, re-extracting once if its signature was rejected, and
+        make the body resumable across dropped connections.
+        """
+        current = {"url": media_url}
+
+        async def reopen(resume_range: Optional[ByteRange]) -> MediaStream:
+            try:
+                return await self._open_direct(current["url"], resume_range, size_hint)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in (403, 410) or refresh is None:
+                    raise
+                logger.info("Media URL rejected with %s, re-extracting", e.status)
+                current["url"] = await refresh()
+                return await self._open_direct(current["url"], resume_range, size_hint)
+
+        if platform is None:
+            media = await reopen(byte_range)
+        else:
+            # Resumes are retried on their own; only the first open counts against the platform
+            with platform_health.breaker(platform).guard(is_platform_failure):
+                media = await reopen(byte_range)
+        if Config.RESUME_MAX_RETRIES <= 0:
+            return media
+        return ResumableMediaStream(
+            media,
+            reopen,
+            max_retries=Config.RESUME_MAX_RETRIES,
+            backoff_base=Config.RESUME_BACKOFF_BASE,
+            backoff_max=Config.RESUME_BACKOFF_MAX,
+        )
+
+    async def _open_direct(
+        self,
+        media_url: str,
+        byte_range: Optional[ByteRange] = None,
+        size_hint: Optional[int] = None,
+    ) -> MediaStream:
+        """
+        Open a direct media URL, forwarding the requested byte range upstream.
 
-    async def _handle_twitter(
-        self, url: str, itag: str, start_byte: int, ailed_itags=None, token=None
-    ):
-        """Twitter/X streaming handler"""
-        ydl_opts = {
-            "format": "best",
-            "quiet": True,
+        When the size is known up front and the span is large, the body is
+        fetched over several concurrent range requests instead of one
+        (per-connection throttled) stream.
+        """
+        span = None
+        if size_hint and Config.SEGMENT_CONCURRENCY > 1:
+            try:
+                span = resolve_range(byte_range or (0, None), size_hint)
+            except RangeNotSatisfiable:
+                span = None  # the hint may be stale; let the upstream decide
+            if span and span[1] - span[0] + 1 < Config.SEGMENT_MIN_SIZE:
+                span = None
+
+        if span:
+            first_end = min(span[0] + Config.SEGMENT_SIZE - 1, span[1])
+            headers = {"Range": f"bytes={span[0]}-{first_end}"}
+        else:
+            headers = {"Range": format_range_header(byte_range)} if byte_range else {}
+
+        session = await get_http_session()
+        response = await session.get(media_url, headers=headers)
+        if response.status == 416:
+            content_range = response.headers.get("Content-Range", "")
+            response.release()
+            total = content_range.rpartition("/")[2]
+            raise RangeNotSatisfiable(int(total) if total.isdigit() else None)
+
+        response.raise_for_status()
+
+        content_range = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+        if span and response.status == 206:
+            if content_range and content_range.group(3) != "*":
+                # Trust the upstream's total over the extractor's hint
+                total = int(content_range.group(3))
+                start, end = resolve_range(byte_range or (0, None), total)
+                first = (start, min(start + Config.SEGMENT_SIZE - 1, end))
+                if (int(content_range.group(1)), int(content_range.group(2))) == first:
+                    return SegmentedMediaStream(
+                        session,
+                        media_url,
+                        response,
+                        start,
+                        end,
+                        total,
+                        partial=byte_range is not None,
+                        segment_size=Config.SEGMENT_SIZE,
+                        concurrency=Config.SEGMENT_CONCURRENCY,
+                    )
+
+            # The first segment doesn't line up with what the client asked for
+            response.release()
+            return await self._open_direct(media_url, byte_range)
+
+        return MediaStream(response, byte_range)
+
+
+class SizeResolver:
+    """
+    Fills in sizes for a formats list without adding latency per format.
+
+    yt-dlp's ``filesize``/``filesize_approx`` and the ``clen`` URL parameter
+    are free; the rest are probed concurrently (HEAD, then a zero-byte Range
+    GET) under a semaphore with a short timeout. A format's size never
+    changes, so probed sizes are memoized per (media id, itag).
+    """
+
+    PROBE_PROTOCOLS = ("http", "https")
+
+    def __init__(self, concurrency: int, timeout: float, max_entries: int):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._probe_slots = asyncio.Semaphore(concurrency)
+        self._sizes: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self.hits = 0
+        self.probes = 0
+        self.probe_failures = 0
+
+    async def resolve(self, media_id: Optional[str], formats: List[Dict]) -> List[Optional[int]]:
+        """Sizes in bytes (None where unknown), in the order of ``formats``."""
+        return await asyncio.gather(*(self._resolve_one(media_id, fmt) for fmt in formats))
+
+    async def _resolve_one(self, media_id: Optional[str], fmt: Dict) -> Optional[int]:
+        size = fmt.get("filesize") or fmt.get("filesize_approx") or parse_clen(fmt.get("url"))
+        if size:
+            return size
+        if fmt.get("protocol", "https") not in self.PROBE_PROTOCOLS:
+            return None  # manifests (HLS/DASH) have no single size to probe
+
+        key = (media_id, fmt.get("format_id")) if media_id else None
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+            self.hits += 1
+            return self._sizes[key]
+
+        size = await self._probe(fmt.get("url"))
+        if size and key:
+            self._sizes[key] = size
+            while len(self._sizes) > self.max_entries:
+                self._sizes.popitem(last=False)
+        return size
+
+    async def _probe(self, url: Optional[str]) -> Optional[int]:
+        if not url:
+            return None
+        session = await get_http_session()
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with self._probe_slots:
+            self.probes += 1
+            try:
+                async with session.head(url, allow_redirects=True, timeout=timeout) as response:
+                    if response.status == 200 and response.content_length:
+                        return response.content_length
+                # Some CDNs don't answer HEAD usefully; a one-byte range reveals the total
+                async with session.get(url, headers={"Range": "bytes=0-0"}, timeout=timeout) as response:
+                    content_range = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+                    if response.status == 206 and content_range and content_range.group(3) != "*":
+                        return int(content_range.group(3))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug("Size probe failed for %s: %s", url, e)
+            self.probe_failures += 1
+            return None
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._sizes),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
         }
 
-        loop = asyncio.get_event_loop()
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await loop.run_in_executor(
-                None, lambda: ydl.extract_info(url, download=False)
-            )
 
-            if not info.get("url"):
-                raise ValueError("No stream URL found for Twitter video")
+size_resolver = SizeResolver(
+    concurrency=Config.SIZE_PROBE_CONCURRENCY,
+    timeout=Config.SIZE_PROBE_TIMEOUT,
+    max_entries=Config.SIZE_CACHE_MAX_ENTRIES,
+)
+
+
+class PlaylistListing:
+    """
+    A flat playlist listing that fills page by page while yt-dlp walks the
+    playlist, and can be read from any cursor while it is still growing.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.title: Optional[str] = None
+        self.entries: List[Dict] = []
+        self.done = False
+        self.error: Optional[str] = None
+        self.exception: Optional[BaseException] = None
+        self.created_at = time.monotonic()
+        self._stop = threading.Event()
+        self._stop_reason: Optional[str] = None
+        self._changed = asyncio.Event()
+
+    def _publish(self, title: str = None, page: List[Dict] = None):
+        if title is not None:
+            self.title = title
+        if page:
+            self.entries.extend(page)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _finish(self, error: str = None, exception: BaseException = None):
+        # Stopped early: the entries are only a prefix of the playlist
+        self.error = error or self._stop_reason
+        self.exception = exception
+        self.done = True
+        self._publish()
+
+    def cancel(self, reason: str = "Playlist listing was cancelled"):
+        """
+        Ask the worker to stop walking the playlist after the current entry.
+        A listing still filling then finishes with ``reason`` as its error.
+        """
+        if not self.done:
+            self._stop_reason = reason
+        self._stop.set()
+
+    async def wait(self):
+        while not self.done:
+            await self._changed.wait()
+
+    async def read(
+        self, cursor: int = 0, limit: int = None, page_size: int = Config.PLAYLIST_PAGE_SIZE
+    ) -> AsyncGenerator[Tuple[int, List[Dict]], None]:
+        """Yield ``(cursor, entries)`` pages from ``cursor`` on, waiting for entries still to come."""
+        end = None if limit is None else cursor + limit
+        while True:
+            changed = self._changed
+            available = len(self.entries) if end is None else min(len(self.entries), end)
+            while cursor < available:
+                page = self.entries[cursor:min(cursor + page_size, available)]
+                yield cursor, page
+                cursor += len(page)
+            if self.done or (end is not None and cursor >= end):
+                return
+            await changed.wait()
+
+
+class PlaylistListings:
+    """
+    Listings shared by every client asking for the same playlist, kept for
+    ``ttl`` seconds so later cursor/limit pages are served from memory.
+    """
+
+    YDL_OPTS = {
+        "extract_flat": "in_playlist",
+        "quiet": True,
+        "no_warnings": True,
+        "ignoreerrors": True,
+        "extractor_args": {
+            "youtube": {
+                "skip": ["dash", "hls"],
+                "player_client": ["web", "android"],
+                "player_skip": ["configs"],
+            }
+        },
+    }
+
+    def __init__(self, max_listings: int, ttl: float, page_size: int, max_entries: int):
+        self.max_listings = max_listings
+        self.ttl = ttl
+        self.page_size = page_size
+        self.max_entries = max_entries
+        self._listings: "OrderedDict[str, PlaylistListing]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, url: str) -> Optional[PlaylistListing]:
+        """The cached (possibly still filling) listing for ``url``, or None; never starts one."""
+        listing = self._listings.get(canonical_url(url))
+        if (
+            listing is not None
+            and listing.error is None
+            and time.monotonic() - listing.created_at < self.ttl
+        ):
+            return listing
+        return None
+
+    def get(self, url: str) -> PlaylistListing:
+        """The cached (possibly still filling) listing for ``url``, starting one if needed."""
+        key = canonical_url(url)
+        listing = self.peek(url)
+        if listing is not None:
+            self._listings.move_to_end(key)
+            self.hits += 1
+            return listing
+
+        self.misses += 1
+        listing = PlaylistListing(url)
+        self._listings[key] = listing
+        self._listings.move_to_end(key)
+        while len(self._listings) > self.max_listings:
+            _, evicted = self._listings.popitem(last=False)
+            evicted.cancel("Playlist listing was evicted before it was complete")
+        asyncio.ensure_future(self._produce(listing))
+        return listing
+
+    async def _produce(self, listing: PlaylistListing):
+        loop = asyncio.get_running_loop()
+        platform = platform_for_url(listing.url)
+        guard = (
+            platform_health.breaker(platform).guard(is_platform_failure)
+            if platform
+            else contextlib.nullcontext()
+        )
+        error = exception = None
+        try:
+            with guard:
+                await extraction_pool.run(
+                    extract_worker.iter_playlist,
+                    listing.url,
+                    self.YDL_OPTS,
+                    lambda title: loop.call_soon_threadsafe(listing._publish, title),
+                    lambda page: loop.call_soon_threadsafe(listing._publish, None, page),
+                    self.page_size,
+                    self.max_entries,
+                    listing._stop,
+                    priority=PRIORITY_METADATA,
+                    executor=extraction_pool.thread_executor,
+                )
+        except Exception as e:
+            logger.error("Playlist listing failed for %s: %s", listing.url, e)
+            error, exception = str(e), e
+        finally:
+            listing._finish(error, exception)
+
+    def stats(self) -> Dict:
+        return {
+            "listings": len(self._listings),
+            "max_listings": self.max_listings,
+            "entries": sum(len(listing.entries) for listing in self._listings.values()),
+            "filling": sum(not listing.done for listing in self._listings.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
 
-            async for chunk in self._stream_from_url(info["url"], start_byte):
-                yield chunk
 
-    async def _stream_from_url(self, media_url: str, start_byte: int):
-        """Generic streaming from a direct media URL"""
-        headers = {"Range": f"bytes={start_byte}-"} if start_byte > 0 else {}
+playlist_listings = PlaylistListings(
+    max_listings=Config.PLAYLIST_CACHE_MAX,
+    ttl=Config.PLAYLIST_CACHE_TTL,
+    page_size=Config.PLAYLIST_PAGE_SIZE,
+    max_entries=Config.PLAYLIST_MAX_ENTRIES,
+)
+
+
+class PlaylistPrefetcher:
+    """
+    Warms extraction for the next items of a playlist while one downloads.
+
+    Each (owner, playlist) pair keeps a window of background extractions at
+    ``PRIORITY_PREFETCH`` for items k+1..k+depth. Starting another item moves
+    the window (cancelling what fell out of it); ``stop`` cancels the window,
+    e.g. when the user aborts. Prefetches are skipped while the extraction
+    queue is half full, so they never crowd out real requests.
+    """
+
+    def __init__(self, depth: int, max_windows: int):
+        self.depth = depth
+        self.max_windows = max_windows
+        self._windows: "OrderedDict[Tuple[str, str], Dict[str, asyncio.Task]]" = OrderedDict()
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.unlisted = 0
+
+    def advance(
+        self, owner: str, playlist_url: str, item_url: str, warm
+    ) -> Optional[Tuple[str, str]]:
+        """
+        ``item_url`` of ``playlist_url`` started downloading: warm the items
+        after it with ``warm(url, priority)``. Returns the window key for ``stop``.
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(media_url, headers=headers) as response:
-                response.raise_for_status()
+        Only a listing that is already cached is used; a download never
+        starts a playlist walk of its own.
+        """
+        if self.depth <= 0:
+            return None
+        listing = playlist_listings.peek(playlist_url)
+        if listing is None:
+            self.unlisted += 1
+            return None
+        key = (owner, canonical_url(playlist_url))
+        index = self._find(listing.entries, item_url)
+        wanted = (
+            []
+            if index is None
+            else [
+                entry["url"]
+                for entry in listing.entries[index + 1:index + 1 + self.depth]
+                if entry.get("url")
+            ]
+        )
+
+        window = self._windows.pop(key, {})
+        for url, task in window.items():
+            if url not in wanted:
+                task.cancel()
+
+        moved = {}
+        for url in wanted:
+            task = window.get(url)
+            if task is None:
+                if extraction_pool.queue_depth >= extraction_pool.max_queue // 2:
+                    self.skipped += 1
+                    continue
+                task = asyncio.ensure_future(warm(url, PRIORITY_PREFETCH))
+                task.add_done_callback(self._count)
+                self.started += 1
+            moved[url] = task
+
+        self._windows[key] = moved
+        while len(self._windows) > self.max_windows:
+            _, evicted = self._windows.popitem(last=False)
+            for task in evicted.values():
+                task.cancel()
+        return key
+
+    def stop(self, key: Optional[Tuple[str, str]]):
+        for task in self._windows.pop(key, {}).values():
+            task.cancel()
+
+    @staticmethod
+    def _find(entries: List[Dict], item_url: str) -> Optional[int]:
+        wanted = identify(item_url)
+        if wanted is None:
+            return None
+        for index, entry in enumerate(entries):
+            if entry.get("id") == wanted.media_id or (
+                entry.get("url") and identify(entry["url"]) == wanted
+            ):
+                return index
+        return None
+
+    def _count(self, task: asyncio.Task):
+        if task.cancelled():
+            self.cancelled += 1
+        elif task.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def stats(self) -> Dict:
+        return {
+            "depth": self.depth,
+            "windows": len(self._windows),
+            "in_flight": sum(
+                not task.done() for window in self._windows.values() for task in window.values()
+            ),
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "skipped": self.skipped,
+            "unlisted": self.unlisted,
+        }
 
-                content_length = response.headers.get("Content-Length")
-                if content_length:
-                    yield f"[CONTENT-LENGTH:{content_length}]".encode()
 
-                async for chunk in response.content.iter_chunked(
-                    1024 * 64
-                ):  # 64KB chunks
-                    yield chunk
+playlist_prefetcher = PlaylistPrefetcher(
+    depth=Config.PREFETCH_DEPTH,
+    max_windows=Config.PREFETCH_MAX_WINDOWS,
+)
 
 
 class StreamMeta:
@@ -348,30 +2748,24 @@ class StreamMeta:
     }
 
     def __init__(self):
-        self.session = aiohttp.ClientSession(headers=self.DEFAULT_HEADERS)
+        self.session: Optional[aiohttp.ClientSession] = None
 
     async def __aenter__(self):
+        self.session = await get_http_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
 
     async def close(self):
-        if not self.session.closed:
-            await self.session.close()
+        # The session is the app-wide pool; it is closed at shutdown, not here.
+        self.session = None
 
-    async def _run_in_executor(self, func, *args):
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, func, *args)
-
-    async def _extract_info(self, url: str, ydl_opts: Dict) -> Dict:
+    async def _extract_info(
+        self, url: str, ydl_opts: Dict, priority: int = PRIORITY_METADATA
+    ) -> Dict:
         """Shared method for info extraction with yt-dlp"""
-
-        def extract():
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                return ydl.extract_info(url, download=False)
-
-        result = await self._run_in_executor(extract)
+        result = await extract_info(url, ydl_opts, priority)
         if not result:
             raise ValueError(f"Could not extract information from {url}")
         return result
@@ -380,39 +2774,63 @@ class StreamMeta:
         self, playlist_url: str
     ) -> Union[Tuple[str, List[Dict[str, str]]]]:
         """Extract playlist name and songs with proper error handling."""
-        ydl_opts = {
-            "extract_flat": "in_playlist",
-            "quiet": True,
-            "no_warnings": True,
-            "ignoreerrors": True,
-            "extractor_args": {
-                "youtube": {
-                    "skip": ["dash", "hls"],
-                    "player_client": ["web", "android"],
-                    "player_skip": ["configs"],
-                }
-            },
-        }
-
         try:
-            result = await self._extract_info(playlist_url, ydl_opts)
-            playlist_name = result.get("title", "Untitled Playlist")
+            listing = playlist_listings.get(playlist_url)
+            await listing.wait()
+            if isinstance(listing.exception, CircuitOpen):
+                raise listing.exception
+            if listing.error:
+                raise RuntimeError(listing.error)
 
-            songs = [
-                {
-                    "title": entry.get("title", "Untitled"),
-                    "url": entry.get("url"),
-                    "id": entry.get("id"),
-                }
-                for entry in result.get("entries", [])
-                if entry  # Skip None entries
-            ]
-
-            return playlist_name, songs
+            return listing.title or "Untitled Playlist", list(listing.entries)
 
+        except CircuitOpen:
+            raise
         except Exception as e:
             raise RuntimeError(f"Failed to fetch playlist: {str(e)}")
 
+    async def stream_playlist(
+        self, playlist_url: str, cursor: int = 0, limit: int = None
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Playlist entries as events, page by page while the listing is walked.
+
+        Yields a ``playlist`` event, ``songs`` pages tagged with their cursor,
+        then ``end`` with the cursor to resume from (None when exhausted), or
+        ``error``.
+        """
+        listing = playlist_listings.get(playlist_url)
+        announced = False
+        next_cursor = cursor
+
+        async for start, songs in listing.read(cursor, limit):
+            if not announced:
+                yield {"type": "playlist", "playlist_name": listing.title, "playlist_url": playlist_url}
+                announced = True
+            yield {"type": "songs", "cursor": start, "songs": songs}
+            next_cursor = start + len(songs)
+
+        if listing.error and next_cursor == cursor:
+            event = {"type": "error", "message": f"Failed to fetch playlist: {listing.error}"}
+            if isinstance(listing.exception, CircuitOpen):
+                event["retry_after"] = int(listing.exception.retry_after) + 1
+            yield event
+            return
+        if not announced:
+            yield {"type": "playlist", "playlist_name": listing.title, "playlist_url": playlist_url}
+
+        # An errored listing stopped short; the client resumes from next_cursor
+        complete = listing.done and listing.error is None
+        exhausted = complete and next_cursor >= len(listing.entries)
+        event = {
+            "type": "end",
+            "count": len(listing.entries) if complete else None,
+            "next_cursor": None if exhausted else next_cursor,
+        }
+        if listing.error:
+            event["error"] = listing.error
+        yield event
+
     async def fetch_streams(self, link: str) -> Dict:
         """Fetch available streams for a given URL."""
         if not link:
@@ -424,6 +2842,7 @@ class StreamMeta:
             "simulate": True,
             "skip_download": True,
             "listformats": False,
+            "noplaylist": True,
             "socket_timeout": 10,
         }
 
@@ -437,16 +2856,10 @@ class StreamMeta:
                 if f.get("ext") == "webm" or (f.get("format_id") in audio_formats) or f.get("format_id")  == '18'
             ]
 
-            streams = []
-            for f in formats:
-                filesize = (
-                    f.get("filesize")
-                    or f.get("filesize_approx")
-                    or None  # Avoid network fetch unless really needed
-                )
-                if filesize is None:
-                    filesize = await self._parse_clen_from_url(f.get("url"))
+            sizes = await size_resolver.resolve(info.get("id"), formats)
 
+            streams = []
+            for f, filesize in zip(formats, sizes):
                 streams.append({
                     "itag": f.get("format_id"),
                     "ext": f.get("ext"),
@@ -471,29 +2884,57 @@ class StreamMeta:
                 },
             }
 
+        except (CircuitOpen, ExtractionTimeout):
+            raise
         except Exception as e:
             return {"success": False, "message": f"Error: {str(e)}"}
 
     async def _parse_clen_from_url(self, url: str) -> Union[int, None]:
         """Parse content length from URL parameters if available."""
-        if not url:
-            return None
-
-        decoded_url = urllib.parse.unquote(url)
-        clen_param = "clen="
-        start_idx = decoded_url.find(clen_param)
+        return parse_clen(url)
 
-        if start_idx == -1:
-            return None
-
-        start_idx += len(clen_param)
-        end_idx = decoded_url.find(";", start_idx) or len(decoded_url)
-        clen_value = decoded_url[start_idx:end_idx]
+    async def batch(
+        self, urls: List[str], kind: str = "formats", itag: str = None
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Run ``fetch_streams`` (or ``get_download_info`` for ``kind="meta"``)
+        for many URLs and yield each result as soon as it is ready.
 
+        At most ``BATCH_CONCURRENCY`` extractions per batch are in flight, so
+        one batch can't fill the shared extraction queue by itself. Closing
+        the generator early cancels whatever is still pending. ``index`` is
+        always the position in ``urls``; empty entries get a failed result.
+        """
+        slots = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+
+        async def run(index: int, url: str) -> Dict:
+            if not url:
+                return {"index": index, "url": url, "success": False, "message": "Empty URL"}
+            async with slots:
+                try:
+                    if kind == "meta":
+                        result = await self.get_download_info(url, itag)
+                    else:
+                        result = await self.fetch_streams(url)
+                except CircuitOpen as e:
+                    # Already streaming a 200; report the 503 per item
+                    result = {
+                        "success": False,
+                        "status": 503,
+                        "message": str(e),
+                        "retry_after": int(e.retry_after) + 1,
+                    }
+                except ExtractionTimeout as e:
+                    result = {"success": False, "status": 504, "message": str(e)}
+            return {"index": index, "url": url, **result}
+
+        tasks = [asyncio.ensure_future(run(i, url)) for i, url in enumerate(urls)]
         try:
-            return int(clen_value)
-        except ValueError:
-            return None
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def get_download_info(self, url: str, itag: str = None) -> dict:
         try:
@@ -535,6 +2976,8 @@ class StreamMeta:
                 "duration": info.get("duration"),
                 "url": info.get("url"),
             }
+        except (CircuitOpen, ExtractionTimeout):
+            raise
         except Exception as e:
             # You can log the error here if you want
             # For now, return an empty dict or error info
@@ -628,40 +3071,109 @@ class StreamMeta:
 
 
 class SearchHandler:
-    def __init__(self, api_key: str):
+    """
+    YouTube search: the Data API first, PyTube as the fallback.
+
+    One instance serves the whole app. API calls go through the shared
+    aiohttp session; PyTube (blocking) runs on a thread with a timeout.
+    Results are cached per normalized query for ``cache_ttl`` seconds (LRU,
+    ``cache_max`` entries) and concurrent identical searches share one
+    lookup. API health is probed in the background every
+    ``health_interval`` seconds instead of on every request, using a 1-unit
+    ``videos`` call rather than a 100-unit ``search``.
+    """
+
+    API_URL = "https://www.googleapis.com/youtube/v3/search"
+    HEALTH_URL = "https://www.googleapis.com/youtube/v3/videos"
+    API_TIMEOUT = 5
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        cache_ttl: float,
+        cache_max: int,
+        health_interval: float,
+        pytube_timeout: float,
+    ):
         self.api_key = api_key
-        self.api_available = self.check_api_health()
-
-    def check_api_health(self) -> bool:
+        self.cache_ttl = cache_ttl
+        self.cache_max = cache_max
+        self.health_interval = health_interval
+        self.pytube_timeout = pytube_timeout
+        # Optimistic until the first probe or a failed search says otherwise
+        self.api_available = bool(api_key)
+        self._results: "OrderedDict[str, Tuple[float, List[Dict[str, str]]]]" = OrderedDict()
+        self._flights = SingleFlight()
+        self._probe: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.api_searches = 0
+        self.pytube_searches = 0
+        self.failures = 0
+
+    def start(self):
+        """Start the background API health probe (call from app startup)."""
+        if self.api_key and self._probe is None:
+            self._probe = asyncio.ensure_future(self._probe_loop())
+
+    async def stop(self):
+        if self._probe is not None:
+            self._probe.cancel()
+            await asyncio.gather(self._probe, return_exceptions=True)
+            self._probe = None
+
+    async def _probe_loop(self):
+        while True:
+            available = await self.check_api_health()
+            if available and not self.api_available:
+                logger.info("✅ YouTube API is available.")
+            elif not available and self.api_available:
+                logger.warning("⚠️ YouTube API unavailable, searching with PyTube")
+            self.api_available = available
+            await asyncio.sleep(self.health_interval)
+
+    async def check_api_health(self) -> bool:
         """Check if the YouTube API is working."""
-        url = "https://www.googleapis.com/youtube/v3/search"
-        params = {"part": "snippet", "q": "test", "maxResults": 1, "key": self.api_key}
+        params = {"part": "id", "id": "dQw4w9WgXcQ", "key": self.api_key}
+        session = await get_http_session()
         try:
-            r = requests.get(url, params=params, timeout=5)
-            r.raise_for_status()
-            logger.info("✅ YouTube API is available.")
+            async with session.get(
+                self.HEALTH_URL,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=self.API_TIMEOUT),
+            ) as r:
+                r.raise_for_status()
             return True
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"⚠️ YouTube API unavailable: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.debug(f"YouTube API health check failed: {e!r}")
             return False
 
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.casefold().split())
+
     async def search_pytube(self, query: str) -> List[Dict[str, str]]:
         """Search YouTube using PyTube."""
-        try:
-            logger.info("🔍 Searching with PyTube...")
+
+        def run():
             search = Search(query)
-            await asyncio.sleep(0)  # Yield to event loop (keeps it async-safe)
             return [
                 {"title": v.title, "url": v.watch_url, "Stype": "youtube"}
                 for v in search.results
             ]
+
+        logger.info("🔍 Searching with PyTube...")
+        self.pytube_searches += 1
+        try:
+            # The thread can't be stopped; on timeout it finishes in the background
+            return await asyncio.wait_for(asyncio.to_thread(run), self.pytube_timeout)
         except Exception as e:
-            logger.error(f"PyTube error: {e}")
+            logger.error(f"PyTube error: {e!r}")
+            self.failures += 1
             return []
 
-    def search_api(self, query: str) -> List[Dict[str, str]]:
+    async def search_api(self, query: str) -> List[Dict[str, str]]:
         """Search YouTube using the API."""
-        url = "https://www.googleapis.com/youtube/v3/search"
         params = {
             "part": "snippet",
             "q": query,
@@ -669,10 +3181,16 @@ class SearchHandler:
             "maxResults": 20,
             "key": self.api_key,
         }
+        self.api_searches += 1
+        session = await get_http_session()
         try:
-            r = requests.get(url, params=params, timeout=5)
-            r.raise_for_status()
-            data = r.json()
+            async with session.get(
+                self.API_URL,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=self.API_TIMEOUT),
+            ) as r:
+                r.raise_for_status()
+                data = await r.json()
             return [
                 {
                     "title": item["snippet"]["title"],
@@ -682,25 +3200,65 @@ class SearchHandler:
                 for item in data.get("items", [])
                 if "videoId" in item.get("id", {})
             ]
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API error: {e}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"API error: {e!r}")
+            self.failures += 1
+            # Until the next probe finds it healthy again
             self.api_available = False
             return []
 
-    async def search(self, query: str) -> List[Dict[str, str]]:
-        """Main search entry point — API first, then PyTube."""
+    async def _search(self, query: str) -> List[Dict[str, str]]:
         if self.api_available:
-            results = self.search_api(query)
+            results = await self.search_api(query)
             if results:
                 return results
         return await self.search_pytube(query)
 
+    async def search(self, query: str) -> List[Dict[str, str]]:
+        """Main search entry point — API first, then PyTube."""
+        key = self.normalize(query)
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._results.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        results = await self._flights.do(key, lambda: self._search(query))
+        if results:  # an empty result is more likely a failure than a real answer
+            self._results[key] = (time.monotonic() + self.cache_ttl, results)
+            self._results.move_to_end(key)
+            while len(self._results) > self.cache_max:
+                self._results.popitem(last=False)
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "api_configured": bool(self.api_key),
+            "api_available": self.api_available,
+            "entries": len(self._results),
+            "max_entries": self.cache_max,
+            "hits": self.hits,
+            "misses": self.misses,
+            "in_flight": self._flights.stats()["in_flight"],
+            "api_searches": self.api_searches,
+            "pytube_searches": self.pytube_searches,
+            "failures": self.failures,
+        }
+
+
+search_handler = SearchHandler(
+    api_key=os.getenv("YOUTUBE_API_KEY"),
+    cache_ttl=Config.SEARCH_CACHE_TTL,
+    cache_max=Config.SEARCH_CACHE_MAX,
+    health_interval=Config.SEARCH_HEALTH_INTERVAL,
+    pytube_timeout=Config.SEARCH_PYTUBE_TIMEOUT,
+)
+
 
 # Example usage:
 # if __name__ == "__main__":
-#     api_key = os.getenv("YOUTUBE_API_KEY")
-#     sh = SearchHandler(api_key)
-#     results = asyncio.run(sh.search("Elley Duhé middle of the night"))
+#     results = asyncio.run(search_handler.search("Elley Duhé middle of the night"))
 #     print(results)
 
 
@@ -0,0 +1,209 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger("MEDIA CACHE")
+
+# (platform, media id, itag)
+MediaKey = Tuple[str, str, str]
+
+
+class MediaCache:
+    """
+    Content-addressed on-disk cache of fully downloaded media.
+
+    Files live at ``<root>/<hh>/<sha256 of key>`` and are written through a
+    temp file plus atomic rename, so a reader never sees a partial file. The
+    total size is kept under ``max_bytes`` by evicting least-recently-served
+    files first; access order survives restarts through file mtimes.
+    """
+
+    WRITE_BUFFER = 1024 * 1024
+
+    def __init__(self, root: str, max_bytes: int, enabled: bool = True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._files: "OrderedDict[str, int]" = OrderedDict()  # path -> size
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+
+    def load(self):
+        """Index files left by a previous run, oldest access first."""
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith(".part"):
+                    os.unlink(path)  # interrupted write from a previous run
+                    continue
+                st = os.stat(path)
+                found.append((st.st_mtime, path, st.st_size))
+
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self._bytes += size
+        self._evict()
+        logger.info("Media cache loaded: %d files, %d bytes", len(self._files), self._bytes)
+
+    def _path_for(self, key: MediaKey) -> str:
+        digest = hashlib.sha256("\0".join(key).encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def lookup(self, key: MediaKey) -> Optional[Tuple[str, int]]:
+        """Return (path, size) of a cached file and mark it recently used."""
+        if not self.enabled:
+            return None
+
+        path = self._path_for(key)
+        size = self._files.get(path)
+        if size is None or not os.path.exists(path):
+            if size is not None:
+                self._forget(path)
+            self.misses += 1
+            return None
+
+        self._files.move_to_end(path)
+        os.utime(path)
+        self.hits += 1
+        return path, size
+
+    def tee(self, key: MediaKey, media, sized: bool = True):
+        """
+        Wrap a full-body MediaStream so its bytes are also written to the cache.
+
+        With ``sized=False`` the stream has no known length (e.g. ffmpeg
+        output) and is trusted to raise if it ends early, so running to the
+        end counts as complete.
+        """
+        if not self.enabled or media.status != 200:
+            return media
+        if sized and (not media.content_length or media.content_length > self.max_bytes):
+            return media
+        return _TeeMediaStream(self, key, media)
+
+    def _commit(self, key: MediaKey, tmp_path: str, size: int):
+        path = self._path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+        self._forget(path)
+        self._files[path] = size
+        self._bytes += size
+        self.stored += 1
+        self._evict(keep=path)
+
+    def _forget(self, path: str):
+        size = self._files.pop(path, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _evict(self, keep: Optional[str] = None):
+        while self._bytes > self.max_bytes and self._files:
+            path = next(iter(self._files))
+            if path == keep:
+                break
+            self._forget(path)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stored": self.stored,
+            "evictions": self.evictions,
+        }
+
+
+class _TeeMediaStream:
+    """MediaStream proxy that copies the body into the cache as it is sent."""
+
+    def __init__(self, cache: MediaCache, key: MediaKey, media):
+        self._cache = cache
+        self._key = key
+        self._media = media
+
+    def __getattr__(self, name):
+        return getattr(self._media, name)
+
+    @staticmethod
+    def _write(f, batch: List[bytes]):
+        for chunk in batch:
+            view = memoryview(chunk)
+            while view:
+                view = view[f.write(view):]
+
+    async def iter_chunks(self, *args, **kwargs):
+        """
+        Pass the body through while a worker thread writes it to disk.
+
+        Chunks are batched up to ``WRITE_BUFFER`` bytes and each batch is
+        written in a thread, at most one at a time so the file stays in
+        order; a slow disk delays the stream by at most one batch and never
+        blocks the event loop.
+        """
+        os.makedirs(self._cache.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache.root, suffix=".part")
+        written = 0
+        complete = False
+        try:
+            with os.fdopen(fd, "wb", buffering=0) as f:
+                pending = None  # the batch being written
+                batch: List[bytes] = []
+                batched = 0
+                try:
+                    async with contextlib.aclosing(self._media.iter_chunks(*args, **kwargs)) as chunks:
+                        async for chunk in chunks:
+                            if written <= self._cache.max_bytes:
+                                batch.append(chunk)
+                                batched += len(chunk)
+                                if batched >= MediaCache.WRITE_BUFFER:
+                                    if pending is not None:
+                                        await pending
+                                    pending = asyncio.ensure_future(
+                                        asyncio.to_thread(self._write, f, batch)
+                                    )
+                                    batch, batched = [], 0
+                            written += len(chunk)
+                            yield chunk
+                    if pending is not None:
+                        await pending
+                    if batch:
+                        await asyncio.to_thread(self._write, f, batch)
+                finally:
+                    if pending is not None and not pending.done():
+                        # The thread can't be cancelled; let it finish before closing the file
+                        await asyncio.wait([pending])
+            if self._media.content_length is None:
+                complete = written <= self._cache.max_bytes
+            else:
+                complete = written == self._media.content_length
+        finally:
+            if complete:
+                self._cache._commit(self._key, tmp_path, written)
+            else:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,144 @@
+import struct
+import time
+import zlib
+from typing import AsyncIterator, List, Tuple
+
+# Every entry is written as zip64 with a trailing data descriptor, since sizes
+# aren't known until the entry has been streamed.
+_VERSION = 45  # 4.5: zip64
+_FLAGS = 0x0808  # bit 3: sizes in data descriptor, bit 11: UTF-8 names
+_STORED = 0
+_MAX32 = 0xFFFFFFFF
+_MAX16 = 0xFFFF
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+
+class ZipStream:
+    """
+    Writes a stored (uncompressed) ZIP archive as a byte stream, one entry at
+    a time, without seeking or buffering entry data.
+
+    Only the central directory (a few dozen bytes per entry) is held until
+    ``finish``; everything else is yielded as soon as it is produced.
+    """
+
+    def __init__(self):
+        self._offset = 0
+        self._entries: List[Tuple[bytes, int, int, int, int, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def add(self, name: str, chunks: AsyncIterator[bytes], mtime: float = None):
+        """
+        Yield the local header, the data of ``chunks`` and the data descriptor.
+
+        If ``chunks`` fails part way, the entry is still closed with a data
+        descriptor for the bytes actually written (so the archive stays
+        readable, with a short entry) and the error is re-raised.
+        """
+        encoded = name.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(mtime or time.time())
+        header_offset = self._offset
+
+        zip64_extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+        header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            _VERSION,
+            _FLAGS,
+            _STORED,
+            dos_time,
+            dos_date,
+            0,  # crc, size: see data descriptor
+            _MAX32,
+            _MAX32,
+            len(encoded),
+            len(zip64_extra),
+        ) + encoded + zip64_extra
+        yield self._emit(header)
+
+        crc = 0
+        size = 0
+        error = None
+        try:
+            async for chunk in chunks:
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                yield self._emit(chunk)
+        except Exception as e:
+            error = e
+
+        yield self._emit(struct.pack("<IIQQ", 0x08074B50, crc, size, size))
+        self._entries.append((encoded, dos_time, dos_date, crc, size, header_offset))
+        if error is not None:
+            raise error
+
+    def finish(self) -> bytes:
+        """Central directory, zip64 end records and end of central directory."""
+        directory = bytearray()
+        for encoded, dos_time, dos_date, crc, size, header_offset in self._entries:
+            zip64_extra = struct.pack("<HHQQQ", 0x0001, 24, size, size, header_offset)
+            directory += struct.pack(
+                "<IHHHHHHIIIHHHHHII",
+                0x02014B50,
+                (3 << 8) | _VERSION,  # made by: UNIX
+                _VERSION,
+                _FLAGS,
+                _STORED,
+                dos_time,
+                dos_date,
+                crc,
+                _MAX32,
+                _MAX32,
+                len(encoded),
+                len(zip64_extra),
+                0,  # comment length
+                0,  # disk number
+                0,  # internal attributes
+                0o100644 << 16,  # external attributes: regular file, rw-r--r--
+                _MAX32,
+            ) + encoded + zip64_extra
+
+        directory_offset = self._offset
+        count = len(self._entries)
+        zip64_end_offset = directory_offset + len(directory)
+
+        directory += struct.pack(
+            "<IQHHIIQQQQ",
+            0x06064B50,
+            44,  # size of the rest of this record
+            (3 << 8) | _VERSION,
+            _VERSION,
+            0,
+            0,
+            count,
+            count,
+            len(directory),
+            directory_offset,
+        )
+        directory += struct.pack("<IIQI", 0x07064B50, 0, zip64_end_offset, 1)
+        directory += struct.pack(
+            "<IHHHHIIH",
+            0x06054B50,
+            0,
+            0,
+            min(count, _MAX16),
+            min(count, _MAX16),
+            min(zip64_end_offset - directory_offset, _MAX32),
+            _MAX32,
+            0,
+        )
+        return self._emit(bytes(directory))
+
+    def _emit(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
@@ -48,5 +48,121 @@ class Config:
     USER_PATH = os.path.join('uploads', 'users')
     SHARE_SAVE_PATH = os.path.join('uploads', 'shares')
 
+    # yt-dlp extraction cache
+    EXTRACT_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", 256))
+    EXTRACT_CACHE_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    EXTRACT_CACHE_MAX_TTL = int(os.getenv("EXTRACT_CACHE_MAX_TTL", 30 * 60))  # seconds
+
+    # Shared upstream HTTP connection pool
+    HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 200))
+    HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 32))
+    HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", 300))  # seconds
+    HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+
+    # Dedicated yt-dlp extraction workers
+    EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", 4))
+    EXTRACT_QUEUE_SIZE = int(os.getenv("EXTRACT_QUEUE_SIZE", 64))
+    EXTRACT_MODE = os.getenv("EXTRACT_MODE", "thread")  # "thread" or "process"
+    EXTRACT_WORKER_MAX_JOBS = int(os.getenv("EXTRACT_WORKER_MAX_JOBS", 50))
+    EXTRACT_WORKER_MAX_RSS_MB = int(os.getenv("EXTRACT_WORKER_MAX_RSS_MB", 512))
+
+    # Segmented (multi-connection) upstream fetching; concurrency 1 disables it
+    SEGMENT_CONCURRENCY = int(os.getenv("SEGMENT_CONCURRENCY", 4))
+    SEGMENT_SIZE = int(os.getenv("SEGMENT_SIZE", 4 * 1024 * 1024))
+    SEGMENT_MIN_SIZE = int(os.getenv("SEGMENT_MIN_SIZE", 16 * 1024 * 1024))
+
+    # On-disk cache of fully downloaded media
+    MEDIA_CACHE_ENABLED = os.getenv("MEDIA_CACHE_ENABLED", "0") == "1"
+    MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", os.path.join('cache', 'media'))
+    MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+
+    # Fan one upstream read out to concurrent downloads of the same media
+    BROADCAST_ENABLED = os.getenv("BROADCAST_ENABLED", "1") == "1"
+    BROADCAST_WINDOW = int(os.getenv("BROADCAST_WINDOW", 8 * 1024 * 1024))
+
+    # Server-side resume of dropped upstream connections; 0 disables it
+    RESUME_MAX_RETRIES = int(os.getenv("RESUME_MAX_RETRIES", 5))
+    RESUME_BACKOFF_BASE = float(os.getenv("RESUME_BACKOFF_BASE", 0.5))  # seconds
+    RESUME_BACKOFF_MAX = float(os.getenv("RESUME_BACKOFF_MAX", 8))
+
+    # ffmpeg pipelines (muxing / transcoding) per worker
+    FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", 2))
+    FFMPEG_MAX_WAITING = int(os.getenv("FFMPEG_MAX_WAITING", 8))
+    FFMPEG_WAIT_TIMEOUT = float(os.getenv("FFMPEG_WAIT_TIMEOUT", 15))  # seconds
+
+    # Audio extraction: CPU-bound transcodes get their own, smaller pool
+    TRANSCODE_MAX_PROCESSES = int(os.getenv("TRANSCODE_MAX_PROCESSES", 2))
+    TRANSCODE_MAX_WAITING = int(os.getenv("TRANSCODE_MAX_WAITING", 8))
+    TRANSCODE_CACHE_ENABLED = os.getenv("TRANSCODE_CACHE_ENABLED", "1") == "1"
+    TRANSCODE_CACHE_PATH = os.getenv("TRANSCODE_CACHE_PATH", os.path.join('cache', 'audio'))
+    TRANSCODE_CACHE_MAX_BYTES = int(os.getenv("TRANSCODE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+    # Size probes for formats without a known filesize
+    SIZE_PROBE_CONCURRENCY = int(os.getenv("SIZE_PROBE_CONCURRENCY", 8))
+    SIZE_PROBE_TIMEOUT = float(os.getenv("SIZE_PROBE_TIMEOUT", 3))  # seconds
+    SIZE_CACHE_MAX_ENTRIES = int(os.getenv("SIZE_CACHE_MAX_ENTRIES", 10000))
+
+    # Batch formats/metadata lookups
+    BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", 25))
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 6))
+
+    # Progressive playlist listings, cached for cursor/limit paging
+    PLAYLIST_PAGE_SIZE = int(os.getenv("PLAYLIST_PAGE_SIZE", 100))
+    PLAYLIST_MAX_ENTRIES = int(os.getenv("PLAYLIST_MAX_ENTRIES", 5000))
+    PLAYLIST_CACHE_MAX = int(os.getenv("PLAYLIST_CACHE_MAX", 32))
+    PLAYLIST_CACHE_TTL = int(os.getenv("PLAYLIST_CACHE_TTL", 600))  # seconds
+
+    # Playlist ZIP archives: entries extracted ahead of the one being streamed
+    ARCHIVE_LOOKAHEAD = int(os.getenv("ARCHIVE_LOOKAHEAD", 3))
+
+    # Look-ahead extraction for clients walking a playlist item by item; 0 disables it
+    PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", 3))
+    PREFETCH_MAX_WINDOWS = int(os.getenv("PREFETCH_MAX_WINDOWS", 256))
+
+    # Short-link (vm.tiktok.com, fb.watch, t.co...) redirect targets
+    SHORTLINK_CACHE_TTL = int(os.getenv("SHORTLINK_CACHE_TTL", 24 * 3600))  # seconds
+    SHORTLINK_CACHE_MAX = int(os.getenv("SHORTLINK_CACHE_MAX", 10000))
+    SHORTLINK_TIMEOUT = float(os.getenv("SHORTLINK_TIMEOUT", 5))  # seconds
+
+    # Learned format availability: per-video negative cache and per-platform itag stats
+    UNAVAILABLE_TTL = int(os.getenv("UNAVAILABLE_TTL", 1800))  # seconds
+    UNAVAILABLE_MAX_ENTRIES = int(os.getenv("UNAVAILABLE_MAX_ENTRIES", 50000))
+    FORMAT_STATS_MIN_SAMPLES = int(os.getenv("FORMAT_STATS_MIN_SAMPLES", 20))
+    FORMAT_STATS_BAD_RATE = float(os.getenv("FORMAT_STATS_BAD_RATE", 0.1))
+
 
     
+
+    # Per-platform circuit breaker around extraction and upstream fetches
+    BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", 60))  # seconds of outcomes considered
+    BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 10))
+    BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))
+    BREAKER_OPEN_SECONDS = int(os.getenv("BREAKER_OPEN_SECONDS", 30))
+    BREAKER_MAX_OPEN_SECONDS = int(os.getenv("BREAKER_MAX_OPEN_SECONDS", 300))
+
+    # Adaptive extraction timeout: p95 latency per platform times a factor, clamped
+    EXTRACT_TIMEOUT_MIN = float(os.getenv("EXTRACT_TIMEOUT_MIN", 10))  # seconds
+    EXTRACT_TIMEOUT_MAX = float(os.getenv("EXTRACT_TIMEOUT_MAX", 60))  # seconds
+    EXTRACT_TIMEOUT_FACTOR = float(os.getenv("EXTRACT_TIMEOUT_FACTOR", 3))
+    EXTRACT_TIMEOUT_MIN_SAMPLES = int(os.getenv("EXTRACT_TIMEOUT_MIN_SAMPLES", 20))
+
+    # Admission control per worker: excess requests get a fast 503 with Retry-After
+    ADMISSION_MAX_STREAMS = int(os.getenv("ADMISSION_MAX_STREAMS", 200))
+    ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", 50))
+    ADMISSION_WAIT_TIMEOUT = float(os.getenv("ADMISSION_WAIT_TIMEOUT", 5))  # seconds
+    ADMISSION_MAX_PENDING_EXTRACTIONS = int(os.getenv("ADMISSION_MAX_PENDING_EXTRACTIONS", 48))
+    ADMISSION_MAX_BUFFERED_MB = int(os.getenv("ADMISSION_MAX_BUFFERED_MB", 512))
+    ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 5))  # seconds
+
+    # Egress bandwidth per worker, shared fairly between users; 0 means unlimited
+    BANDWIDTH_GLOBAL_KBPS = int(os.getenv("BANDWIDTH_GLOBAL_KBPS", 0))  # KiB/s
+    BANDWIDTH_USER_KBPS = int(os.getenv("BANDWIDTH_USER_KBPS", 0))  # KiB/s
+    BANDWIDTH_BURST_MB = int(os.getenv("BANDWIDTH_BURST_MB", 16))
+
+    # YouTube search: result cache per normalized query and API health probing
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 600))  # seconds
+    SEARCH_CACHE_MAX = int(os.getenv("SEARCH_CACHE_MAX", 2000))
+    SEARCH_HEALTH_INTERVAL = int(os.getenv("SEARCH_HEALTH_INTERVAL", 300))  # seconds
+    SEARCH_PYTUBE_TIMEOUT = float(os.getenv("SEARCH_PYTUBE_TIMEOUT", 10))  # seconds
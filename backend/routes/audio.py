@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from typing import Optional
+from uuid import UUID
+
+from utils.limiter import limiter
+from utils.logger import setup_logger
+from utils.streaming import audio_response
+from common.index import StreamDownloader, AUDIO_BITRATES, AUDIO_OUTPUTS
+
+logger = setup_logger("AUDIO ROUTES")
+audio_router = APIRouter()
+
+downloader = StreamDownloader()
+
+
+class AudioRequest(BaseModel):
+    url: str
+    id: UUID
+    format: Optional[str] = "mp3"
+    bitrate: Optional[int] = 192
+
+
+@audio_router.post("/download")
+@limiter.limit("50/day")
+async def download_audio(request: Request, data: AudioRequest):
+    """
+    Extract the audio track of any supported platform's media.
+
+    Parameters:
+    - url: The media URL
+    - id: Unique identifier for the download
+    - format: mp3, m4a, webm, or original to keep the source codec
+    - bitrate: Target bitrate in kbps when re-encoding
+    """
+    try:
+        if not data.url:
+            raise HTTPException(status_code=400, detail="URL is required")
+        if data.format != "original" and data.format not in AUDIO_OUTPUTS:
+            raise HTTPException(status_code=400, detail=f"Unsupported audio format: {data.format}")
+        if data.bitrate not in AUDIO_BITRATES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Bitrate must be one of {', '.join(map(str, AUDIO_BITRATES))}",
+            )
+
+        return await audio_response(downloader, request, data)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -5,8 +5,6 @@ from pydantic import BaseModel, EmailStr
 from typing import List
 import asyncio
 from fastapi import Query
-from fastapi.responses import StreamingResponse
-import mimetypes, os
 
 from utils.limiter import limiter
 
@@ -16,6 +14,7 @@ from models import User as Users
 from typing import Optional
 from utils.logger import setup_logger
 from utils.auth import get_current_user
+from utils.streaming import download_response
 from common.index import StreamDownloader
 
 logger = setup_logger("INSTAGRAM ROUTES")
@@ -49,33 +48,17 @@ async def download_instagram(
     - url: The media URL to download
     - id: Unique identifier for the download
     - itag: Quality format identifier
-    - start_byte: Byte position to start download from (for resuming)
+    - start_byte: Byte position to start download from (for resuming); a Range header takes precedence
     - ext: File extension (optional)
     """
     try:
         if not data.url:
             raise HTTPException(status_code=400, detail="URL is required")
 
-        # Set default extension if not provided
-        file_ext = data.ext or "mp4"
-        content_type = mimetypes.guess_type(f"file.{file_ext}")[0] or "video/mp4"
-
-        headers = {
-            "Content-Disposition": f'attachment; filename="{data.id}.{file_ext}"',
-            "Accept-Ranges": "bytes",
-            "X-Download-URL": str(data.id),
-            "Content-Type": content_type,
-            "format": file_ext,
-        }
-
-        async def generate():
-            async for chunk in downloader.download_stream(
-                url=data.url, itag=data.itag, start_byte=data.start_byte
-            ):
-                yield chunk
-
-        return StreamingResponse(generate(), media_type="video/mp4", headers=headers)
+        return await download_response(downloader, request, data)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
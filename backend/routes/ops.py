@@ -0,0 +1,143 @@
+from fastapi import APIRouter, Depends, Request
+
+from utils.auth import get_current_user
+from utils.limiter import limiter
+from utils.logger import setup_logger
+from common.index import (
+    StreamDownloader,
+    admission,
+    bandwidth,
+    extraction_cache,
+    extraction_flights,
+    extraction_pool,
+    ffmpeg_pool,
+    format_availability,
+    media_cache,
+    platform_health,
+    playlist_listings,
+    playlist_prefetcher,
+    search_handler,
+    short_links,
+    size_resolver,
+    transcode_cache,
+    transcode_pool,
+)
+
+logger = setup_logger("OPS ROUTES")
+# Internal counters (queue depths, cached URLs, client keys): signed-in users only
+ops_router = APIRouter(dependencies=[Depends(get_current_user)])
+
+
+@ops_router.get("/extraction-cache")
+@limiter.limit("60/min")
+async def get_extraction_cache_stats(request: Request):
+    """Hit/miss counters and occupancy of the shared yt-dlp extraction cache."""
+    return extraction_cache.stats()
+
+
+@ops_router.get("/extraction-flights")
+@limiter.limit("60/min")
+async def get_extraction_flight_stats(request: Request):
+    """How many concurrent extractions were coalesced onto an in-flight one."""
+    return extraction_flights.stats()
+
+
+@ops_router.get("/extraction-pool")
+@limiter.limit("60/min")
+async def get_extraction_pool_stats(request: Request):
+    """Queue depth, wait time and run time of the dedicated extraction workers."""
+    return extraction_pool.stats()
+
+
+@ops_router.get("/media-cache")
+@limiter.limit("60/min")
+async def get_media_cache_stats(request: Request):
+    """Occupancy and hit rate of the on-disk media cache."""
+    return media_cache.stats()
+
+
+@ops_router.get("/broadcasts")
+@limiter.limit("60/min")
+async def get_broadcast_stats(request: Request):
+    """Upstream reads shared between concurrent downloads of the same media."""
+    return {
+        **StreamDownloader.broadcast_stats,
+        "joinable": len(StreamDownloader.broadcasts),
+    }
+
+
+@ops_router.get("/ffmpeg")
+@limiter.limit("60/min")
+async def get_ffmpeg_stats(request: Request):
+    """Running and queued ffmpeg pipelines on this worker."""
+    return ffmpeg_pool.stats()
+
+
+@ops_router.get("/transcode")
+@limiter.limit("60/min")
+async def get_transcode_stats(request: Request):
+    """Audio transcoder pool and transcode cache."""
+    return {"pool": transcode_pool.stats(), "cache": transcode_cache.stats()}
+
+
+@ops_router.get("/sizes")
+@limiter.limit("60/min")
+async def get_size_stats(request: Request):
+    """Memoized format sizes and size-probe counters."""
+    return size_resolver.stats()
+
+
+@ops_router.get("/playlists")
+@limiter.limit("60/min")
+async def get_playlist_stats(request: Request):
+    """Cached playlist listings, including ones still being walked."""
+    return playlist_listings.stats()
+
+
+@ops_router.get("/prefetch")
+@limiter.limit("60/min")
+async def get_prefetch_stats(request: Request):
+    """Playlist look-ahead extraction windows and outcomes."""
+    return playlist_prefetcher.stats()
+
+
+@ops_router.get("/short-links")
+@limiter.limit("60/min")
+async def get_short_link_stats(request: Request):
+    """Short-link redirect resolution cache."""
+    return short_links.stats()
+
+
+@ops_router.get("/formats")
+@limiter.limit("60/min")
+async def get_format_stats(request: Request):
+    """Per-platform itag outcomes and the unavailable-format negative cache."""
+    return format_availability.stats()
+
+
+@ops_router.get("/breakers")
+@limiter.limit("60/min")
+async def get_breaker_stats(request: Request):
+    """Per-platform circuit breaker state and adaptive extraction timeouts."""
+    return platform_health.stats()
+
+
+@ops_router.get("/admission")
+@limiter.limit("60/min")
+async def get_admission_stats(request: Request):
+    """Active and waiting download streams, pending extractions, buffered bytes and rejections."""
+    return admission.stats()
+
+
+@ops_router.get("/bandwidth")
+@limiter.limit("60/min")
+async def get_bandwidth_stats(request: Request):
+    """Egress rates, per-user fair share and time spent throttling."""
+    return bandwidth.stats()
+
+
+@ops_router.get("/search")
+@limiter.limit("60/min")
+async def get_search_stats(request: Request):
+    """YouTube search result cache and API availability."""
+    return search_handler.stats()
@@ -16,7 +16,21 @@ from models import User as Users
 from typing import Optional
 from utils.logger import setup_logger
 from utils.auth import get_current_user
-from common.index import StreamDownloader, StreamMeta, SearchHandler
+from utils.streaming import (
+    archive_response,
+    download_response,
+    event_stream_response,
+    shed_extraction_load,
+    unavailable_error,
+)
+from common.index import (
+    CircuitOpen,
+    ExtractionTimeout,
+    StreamDownloader,
+    StreamMeta,
+    search_handler,
+)
+from config import Config
 
 
 from dotenv import load_dotenv
@@ -37,6 +51,8 @@ class DownloadRequest(BaseModel):
     start_byte: Optional[int] = 0
     ext: Optional[str] = None
     format: Optional[str] = None
+    mux: Optional[bool] = False
+    listUrl: Optional[str] = None
 
 
 @youtube_router.post("/{username}/download")
@@ -54,36 +70,19 @@ async def download_instagram(
     - url: The media URL to download
     - id: Unique identifier for the download
     - itag: Quality format identifier
-    - start_byte: Byte position to start download from (for resuming)
+    - start_byte: Byte position to start download from (for resuming); a Range header takes precedence
     - ext: File extension (optional)
+    - mux: Mux a video-only itag with the best audio itag server-side
+    - listUrl: Playlist the item belongs to; the next items are extracted ahead
     """
     try:
         if not data.url:
             raise HTTPException(status_code=400, detail="URL is required")
 
-        # Set default extension if not provided
-        file_ext = data.ext or "mp4"
-        content_type = mimetypes.guess_type(f"file.{file_ext}")[0] or "video/mp4"
-
-        headers = {
-            "Content-Disposition": f'attachment; filename="{data.id}.{file_ext}"',
-            "Accept-Ranges": "bytes",
-            "X-Download-URL": str(data.id),
-            "Content-Type": content_type,
-            "format": file_ext,
-        }
-
-        async def generate():
-            async for chunk in downloader.download_stream(
-                url=data.url,
-                itag=data.itag,
-                start_byte=data.start_byte,
-                token=current["token"],
-            ):
-                yield chunk
-
-        return StreamingResponse(generate(), media_type="video/mp4", headers=headers)
+        return await download_response(downloader, request, data, token=current["token"])
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -93,7 +92,7 @@ class ListRequest(BaseModel):
     listUrl: str = None
 
 
-@youtube_router.post("/{username}/list")
+@youtube_router.post("/{username}/list", dependencies=[Depends(shed_extraction_load)])
 @limiter.limit("50/day")
 async def get_youtube_songs(request: Request, data: ListRequest):
     if not data.listUrl:
@@ -124,18 +123,72 @@ async def get_youtube_songs(request: Request, data: ListRequest):
 
     except HTTPException:
         raise
+    except CircuitOpen as e:
+        raise unavailable_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to process playlist: {str(e)}"
         )
 
 
+class ListStreamRequest(BaseModel):
+    listUrl: str = None
+    cursor: Optional[int] = 0
+    limit: Optional[int] = None
+
+
+@youtube_router.post("/{username}/list/stream", dependencies=[Depends(shed_extraction_load)])
+@limiter.limit("50/day")
+async def stream_youtube_songs(request: Request, data: ListStreamRequest):
+    """
+    Playlist entries streamed page by page as the playlist is walked.
+
+    NDJSON (or server-sent events with ``Accept: text/event-stream``) of
+    ``playlist``, ``songs`` and ``end`` events. ``end.next_cursor`` resumes
+    the listing with ``cursor``/``limit``; later pages come from the cached
+    listing.
+    """
+    if not data.listUrl:
+        raise HTTPException(status_code=400, detail="Playlist URL is required")
+    if (data.cursor or 0) < 0 or (data.limit is not None and data.limit < 1):
+        raise HTTPException(status_code=400, detail="Invalid cursor or limit")
+
+    async def events():
+        async with StreamMeta() as stream_meta:
+            async for event in stream_meta.stream_playlist(
+                data.listUrl, data.cursor or 0, data.limit
+            ):
+                yield event
+
+    return event_stream_response(request, events())
+
+
+class ArchiveRequest(BaseModel):
+    listUrl: str = None
+    itag: Optional[str] = "best"
+
+
+@youtube_router.post("/{username}/list/archive")
+@limiter.limit("10/day")
+async def download_playlist_archive(request: Request, data: ArchiveRequest):
+    """
+    Download a whole playlist as one ZIP, streamed as it is built.
+
+    Entries are stored uncompressed, in playlist order; ones that fail are
+    listed in ``_failed.txt`` inside the archive.
+    """
+    if not data.listUrl:
+        raise HTTPException(status_code=400, detail="Playlist URL is required")
+
+    return await archive_response(downloader, request, data)
+
+
 class DownloadMetatRequest(BaseModel):
     url: str
     itag: Optional[str] = None
 
 
-@youtube_router.post("/download-meta")
+@youtube_router.post("/download-meta", dependencies=[Depends(shed_extraction_load)])
 @limiter.limit("60/min")
 async def get_download_meta(request: Request, data: DownloadMetatRequest):
     if not data.url:
@@ -147,6 +200,8 @@ async def get_download_meta(request: Request, data: DownloadMetatRequest):
 
         return r
 
+    except (CircuitOpen, ExtractionTimeout) as e:
+        raise unavailable_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to process download meta: {str(e)}"
@@ -157,7 +212,7 @@ class GetFormatstRequest(BaseModel):
     url: str
 
 
-@youtube_router.post("/get-formats")
+@youtube_router.post("/get-formats", dependencies=[Depends(shed_extraction_load)])
 @limiter.limit("60/min")
 async def get_url_formats(request: Request, data: GetFormatstRequest):
     if not data.url:
@@ -169,22 +224,52 @@ async def get_url_formats(request: Request, data: GetFormatstRequest):
 
         return r
 
+    except (CircuitOpen, ExtractionTimeout) as e:
+        raise unavailable_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to process download meta: {str(e)}"
         )
 
 
+class BatchRequest(BaseModel):
+    urls: List[str]
+    kind: Optional[str] = "formats"  # "formats" or "meta"
+    itag: Optional[str] = None
+
+
+@youtube_router.post("/batch", dependencies=[Depends(shed_extraction_load)])
+@limiter.limit("20/min")
+async def get_batch(request: Request, data: BatchRequest):
+    """
+    Formats (or download meta) for many URLs in one request.
+
+    Results are streamed as each extraction finishes, tagged with the
+    ``index`` of their URL: NDJSON by default, server-sent events with
+    ``Accept: text/event-stream``.
+    """
+    if not any(data.urls):
+        raise HTTPException(status_code=400, detail="At least one URL is required")
+    if len(data.urls) > Config.BATCH_MAX_URLS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {Config.BATCH_MAX_URLS} URLs per batch"
+        )
+    if data.kind not in ("formats", "meta"):
+        raise HTTPException(status_code=400, detail="kind must be 'formats' or 'meta'")
+
+    async def results():
+        async with StreamMeta() as stream_meta:
+            async for result in stream_meta.batch(data.urls, data.kind, data.itag):
+                yield result
+
+    return event_stream_response(request, results())
+
+
 @youtube_router.get("/search")
 @limiter.limit("60/min")
 async def search(request: Request, q: str = Query(..., min_length=1)):
     try:
-        api_key = os.getenv("YOUTUBE_API_KEY")
-
-        search_handler =  SearchHandler(api_key=api_key)
-        r = await search_handler.search(q)
-
-        return r
+        return await search_handler.search(q)
 
     except Exception as e:
         raise HTTPException(
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+sys.path.insert(0, BACKEND_DIR)
+# Spotify credentials are read at import time; the tests never reach Spotify
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "test")
+
+from common import index  # noqa: E402
+
+
+def load_fixture(name: str):
+    with open(os.path.join(FIXTURES_DIR, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Module-level caches, pools and counters, new for every test."""
+    monkeypatch.setattr(
+        index,
+        "extraction_cache",
+        index.ExtractionCache(max_entries=100, max_bytes=64 * 1024 * 1024, max_ttl=3600),
+    )
+    monkeypatch.setattr(index, "extraction_flights", index.SingleFlight())
+    monkeypatch.setattr(
+        index,
+        "extraction_pool",
+        index.ExtractionPool(
+            workers=2, max_queue=16, mode="thread", max_jobs_per_worker=100, max_worker_rss=0
+        ),
+    )
+    monkeypatch.setattr(
+        index,
+        "format_availability",
+        index.FormatAvailability(ttl=600, max_entries=100, min_samples=1000, bad_rate=1.0),
+    )
+    monkeypatch.setattr(index.StreamDownloader, "broadcasts", {})
+    monkeypatch.setattr(
+        index.StreamDownloader, "broadcast_stats", {"started": 0, "joined": 0, "fallbacks": 0}
+    )
+    yield
+    index.extraction_pool.shutdown()
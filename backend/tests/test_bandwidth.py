@@ -0,0 +1,46 @@
+"""Media-cache and transcode-cache hits share the fair-share bandwidth limits."""
+import asyncio
+import time
+
+from common import index
+from common.bandwidth import BandwidthScheduler
+from utils import streaming
+
+SIZE = 256 * 1024
+
+
+def test_cache_hits_are_paced(monkeypatch, tmp_path):
+    scheduler = BandwidthScheduler(global_rate=0, user_rate=1024 * 1024, burst=64 * 1024)
+    monkeypatch.setattr(streaming, "bandwidth", scheduler)
+    path = tmp_path / "media"
+    path.write_bytes(b"\0" * SIZE)
+    media = index.CachedMedia(str(path), SIZE, ext="mp4", content_type="video/mp4")
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [],
+        "extensions": {"http.response.pathsend": {}},
+    }
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body":
+            assert scheduler.stats()["active_streams"] == 1
+
+    response = streaming._media_response(media, "id", "mp4", "video/mp4", client="1.2.3.4")
+    started = time.monotonic()
+    asyncio.run(response(scope, receive, send))
+    elapsed = time.monotonic() - started
+
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    assert len(body) == SIZE
+    assert not any(m["type"] == "http.response.pathsend" for m in sent)
+    assert scheduler.bytes_sent == SIZE
+    assert scheduler.stats()["active_streams"] == 0
+    # (SIZE - burst) bytes at 1 MiB/s
+    assert elapsed >= 0.15
@@ -0,0 +1,106 @@
+"""
+MediaBroadcast pacing: one shared upstream read must not run ahead of its
+subscribers and download media nobody is going to read from the buffer.
+"""
+import asyncio
+import contextlib
+
+from common import index
+
+CHUNK = 64 * 1024
+WINDOW = 4 * CHUNK
+
+
+class _Source:
+    """MediaStream stand-in producing ``chunks`` chunks; counts what was read upstream."""
+
+    content_type = "video/mp4"
+    status = 200
+    start = end = total = None
+    headers = {}
+
+    def __init__(self, chunks: int):
+        self.content_length = chunks * CHUNK
+        self.chunks = chunks
+        self.produced = 0
+
+    async def iter_chunks(self, chunk_size: int = CHUNK):
+        for _ in range(self.chunks):
+            await asyncio.sleep(0)
+            self.produced += CHUNK
+            yield b"\0" * CHUNK
+
+    def close(self):
+        pass
+
+
+def _broadcast(source: _Source, reopened: list):
+    async def reopen(offset):
+        reopened.append(offset)
+        return _Source((source.content_length - offset) // CHUNK)
+
+    stats = {"started": 0, "joined": 0, "fallbacks": 0}
+    return index.MediaBroadcast("key", source, WINDOW, reopen, registry={}, stats=stats)
+
+
+def test_single_slow_subscriber_paces_the_reader():
+    async def main():
+        source = _Source(400)  # 25 MB
+        reopened = []
+        broadcast = _broadcast(source, reopened)
+        received = 0
+        async with contextlib.aclosing(broadcast.view().iter_chunks()) as chunks:
+            async for chunk in chunks:
+                received += len(chunk)
+                await asyncio.sleep(0.001)  # slower than upstream
+                if received >= 20 * CHUNK:
+                    break
+            assert source.produced <= received + WINDOW + CHUNK
+        await asyncio.sleep(0)
+        assert reopened == []
+        assert broadcast._reader.done()
+        assert source.produced < 30 * CHUNK
+
+    asyncio.run(main())
+
+
+def test_single_subscriber_reads_the_whole_body():
+    async def main():
+        source = _Source(40)
+        broadcast = _broadcast(source, [])
+        received = 0
+        async for chunk in broadcast.view().iter_chunks():
+            received += len(chunk)
+            await asyncio.sleep(0.001)
+        assert received == source.content_length
+        assert source.produced == source.content_length
+
+    asyncio.run(main())
+
+
+def test_reader_stops_once_every_subscriber_fell_back():
+    async def main():
+        source = _Source(400)
+        reopened = []
+        broadcast = _broadcast(source, reopened)
+        stalled = broadcast.view().iter_chunks()
+        fast = broadcast.view().iter_chunks()
+
+        await stalled.__anext__()
+        # With two attached the reader isn't paced: the stalled one falls out of the window
+        for _ in range(10):
+            await fast.__anext__()
+        await stalled.__anext__()
+        assert reopened == [CHUNK]
+        assert len(broadcast._offsets) == 1
+        assert broadcast._stats["fallbacks"] == 1
+
+        await fast.aclose()
+        await asyncio.sleep(0)
+        assert broadcast._reader.done()
+        produced = source.produced
+        await stalled.__anext__()  # still served by its own upstream
+        await stalled.aclose()
+        assert source.produced == produced
+
+    asyncio.run(main())
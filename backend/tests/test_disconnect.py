@@ -0,0 +1,220 @@
+"""
+A download client going away tears down everything behind its response:
+the upstream read, the queued extraction, its admission slot and its
+broadcast subscription. Upstream is a local aiohttp server.
+"""
+import asyncio
+import copy
+import threading
+from types import SimpleNamespace
+
+import pytest
+import yt_dlp
+from aiohttp import web
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from common import index
+from common.admission import AdmissionController
+from conftest import load_fixture
+from utils import streaming
+
+CHUNK = 64 * 1024
+
+
+@pytest.fixture(autouse=True)
+def fresh_admission(monkeypatch):
+    controller = AdmissionController(
+        max_streams=4,
+        max_waiting=4,
+        wait_timeout=1,
+        max_pending_extractions=16,
+        max_buffered_bytes=1024 * 1024 * 1024,
+        retry_after=1,
+        pending_extractions=lambda: index.extraction_pool.queue_depth,
+        buffered_bytes=lambda: 0,
+    )
+    monkeypatch.setattr(streaming, "admission", controller)
+    return controller
+
+
+class _Client:
+    """ASGI side of one download request; ``disconnect`` is what the server sees on hang-up."""
+
+    def __init__(self):
+        self.scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/api/youtube/download",
+            "headers": [],
+            "query_string": b"",
+            "client": ("127.0.0.1", 50000),
+        }
+        self._messages = asyncio.Queue()
+        self.chunks = 0
+        self.on_chunk = None
+
+    def request(self) -> Request:
+        return Request(self.scope, self.receive)
+
+    async def receive(self):
+        return await self._messages.get()
+
+    def disconnect(self):
+        self._messages.put_nowait({"type": "http.disconnect"})
+
+    async def send(self, message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            self.chunks += 1
+            if self.on_chunk is not None:
+                self.on_chunk(self.chunks)
+            # A slow socket write: the hang-up lands here, outside the body iterator
+            await asyncio.sleep(0.01)
+
+
+class _Upstream:
+    """Serves an endless media body and notes when the reader hangs up."""
+
+    def __init__(self):
+        self.requests = 0
+        self.dropped = asyncio.Event()
+        self._runner = None
+        self.url = None
+
+    async def _media(self, request):
+        self.requests += 1
+        response = web.StreamResponse(headers={"Content-Type": "video/mp4"})
+        await response.prepare(request)
+        try:
+            while True:
+                await response.write(b"\0" * CHUNK)
+                await asyncio.sleep(0.005)
+        except (ConnectionError, asyncio.CancelledError):
+            self.dropped.set()
+            raise
+        return response
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/videoplayback", self._media)
+        self._runner = web.AppRunner(app, shutdown_timeout=1)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/videoplayback"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+class _Downloader(index.StreamDownloader):
+    def __init__(self, media_url: str):
+        super().__init__()
+        self.media_url = media_url
+
+    async def open_stream(self, url, itag="best", byte_range=None, start_byte=0, token=None):
+        return await self._open_url(self.media_url, byte_range)
+
+
+def _download(url: str):
+    return SimpleNamespace(
+        url=url, id="dQw4w9WgXcQ", ext="mp4", itag="18", start_byte=0, mux=False, listUrl=None
+    )
+
+
+def test_disconnect_mid_body_releases_upstream_and_slot(fresh_admission):
+    async def main():
+        try:
+            async with _Upstream() as upstream:
+                client = _Client()
+                downloader = _Downloader(upstream.url)
+                response = await streaming.download_response(
+                    downloader,
+                    client.request(),
+                    _download("https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+                )
+                assert fresh_admission.stats()["active_streams"] == 1
+                broadcast = downloader.broadcasts[upstream.url]
+
+                def hang_up(count):
+                    if count == 3:
+                        client.disconnect()
+
+                client.on_chunk = hang_up
+                await asyncio.wait_for(response(client.scope, client.receive, client.send), 5)
+
+                # Torn down by the time the response returns, not when the GC gets to it
+                session = await index.get_http_session()
+                assert not session.connector._acquired
+                assert not broadcast._offsets
+                assert not downloader.broadcasts
+                assert fresh_admission.stats()["active_streams"] == 0
+                assert client.chunks >= 3
+
+                await asyncio.wait_for(upstream.dropped.wait(), 5)
+                assert upstream.requests == 1
+        finally:
+            await index.close_http_session()
+
+    asyncio.run(main())
+
+
+def test_disconnect_while_extraction_is_queued_cancels_the_job(fresh_admission, monkeypatch):
+    monkeypatch.setattr(
+        index, "extraction_pool", index.ExtractionPool(workers=1, max_queue=16, mode="thread")
+    )
+    info = load_fixture("youtube_watch.json")
+    blocking_url = "https://www.youtube.com/watch?v=aaaaaaaaaaa"
+    release = threading.Event()
+    extracted = []
+
+    def extract_info(self, url, download=True, *args, **kwargs):
+        extracted.append(url)
+        if url == blocking_url:
+            release.wait(5)
+        return copy.deepcopy(info)
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_info)
+
+    async def main():
+        pool = index.extraction_pool
+        # Occupy the only worker so the download's extraction has to queue
+        blocker = asyncio.ensure_future(index.extract_info(blocking_url, {"noplaylist": True}))
+        while not extracted:
+            await asyncio.sleep(0.01)
+
+        client = _Client()
+        download = asyncio.ensure_future(
+            streaming.download_response(
+                index.StreamDownloader(),
+                client.request(),
+                _download("https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+            )
+        )
+        while pool.queue_depth < 1:
+            await asyncio.sleep(0.01)
+        assert fresh_admission.stats()["active_streams"] == 1
+
+        client.disconnect()
+        with pytest.raises(HTTPException) as error:
+            await asyncio.wait_for(download, 5)
+        assert error.value.status_code == 499
+
+        assert pool.queue_depth == 0
+        assert len(index.extraction_flights._flights) == 1  # only the blocker's
+        assert fresh_admission.stats()["active_streams"] == 0
+
+        release.set()
+        await asyncio.wait_for(blocker, 5)
+        await asyncio.sleep(0.05)
+        # The cancelled job never reached yt-dlp, even once the worker was free
+        assert extracted == [blocking_url]
+        assert pool.stats()["running"] == 0
+        assert not index.StreamDownloader.broadcasts
+
+    try:
+        asyncio.run(main())
+    finally:
+        release.set()
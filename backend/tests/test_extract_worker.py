@@ -0,0 +1,32 @@
+"""Errors raised in an extraction worker process must survive the trip back."""
+import pickle
+import sys
+
+import pytest
+import yt_dlp
+
+from common import extract_worker, index
+
+
+@pytest.fixture
+def rate_limited(monkeypatch):
+    def extract_info(self, url, download=True, *args, **kwargs):
+        try:
+            raise yt_dlp.utils.ExtractorError("HTTP Error 429: Too Many Requests")
+        except yt_dlp.utils.ExtractorError:
+            # What yt-dlp does: a DownloadError holding the traceback
+            self.report_error("unable to download webpage: HTTP Error 429", sys.exc_info())
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_info)
+
+
+def test_download_error_is_picklable(rate_limited):
+    with pytest.raises(yt_dlp.utils.DownloadError) as error:
+        extract_worker.extract_in_process(
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ", {"quiet": True}
+        )
+
+    received = pickle.loads(pickle.dumps(error.value))
+
+    assert "HTTP Error 429" in str(received)
+    assert index.is_platform_failure(received)
@@ -0,0 +1,71 @@
+"""open_muxed must not leak the upstream that opened when its partner fails."""
+import asyncio
+import copy
+
+import aiohttp
+import pytest
+import yt_dlp
+from aiohttp import web
+
+from common import index
+from conftest import load_fixture
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+class _Upstream:
+    """Serves every itag except the ``missing`` ones, which get a 404."""
+
+    def __init__(self, missing):
+        self.missing = set(missing)
+        self.served = []
+        self.url = None
+
+    async def _media(self, request):
+        itag = request.query["itag"]
+        if itag in self.missing:
+            raise web.HTTPNotFound()
+        self.served.append(itag)
+        return web.Response(body=b"\0" * 256 * 1024, content_type="video/mp4")
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/videoplayback", self._media)
+        self._runner = web.AppRunner(app, shutdown_timeout=1)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/videoplayback"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+def test_failed_audio_open_closes_the_opened_video(monkeypatch):
+    monkeypatch.setattr(index.ffmpeg_pool, "check_available", lambda: None)
+    info = load_fixture("youtube_watch.json")
+
+    async def main():
+        try:
+            async with _Upstream(missing={"140"}) as upstream:
+                for fmt in info["formats"]:
+                    fmt["url"] = f"{upstream.url}?itag={fmt['format_id']}"
+
+                def extract_info(self, url, download=True, *args, **kwargs):
+                    return copy.deepcopy(info)
+
+                monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_info)
+
+                with pytest.raises(aiohttp.ClientResponseError):
+                    await index.StreamDownloader().open_muxed(URL, itag="137")
+
+                assert upstream.served == ["137"]
+                assert not index.StreamDownloader.broadcasts
+                session = await index.get_http_session()
+                assert not session.connector._acquired
+        finally:
+            await index.close_http_session()
+
+    asyncio.run(main())
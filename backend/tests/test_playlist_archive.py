@@ -0,0 +1,49 @@
+"""A playlist archive survives an entry failing part way through."""
+import asyncio
+import io
+import zipfile
+
+from common import index
+
+PLAYLIST = "https://www.youtube.com/playlist?list=PLaaaaaaaaaaaaaaaa"
+
+
+class _Downloader(index.StreamDownloader):
+    """Serves each entry from the media cache; ``broken`` ones vanish from disk mid-archive."""
+
+    def __init__(self, tmp_path, broken):
+        super().__init__()
+        self.tmp_path = tmp_path
+        self.broken = set(broken)
+
+    async def prefetch_info(self, url, priority=index.PRIORITY_DOWNLOAD):
+        pass
+
+    async def open_stream(self, url, itag="best", byte_range=None, start_byte=0, token=None):
+        path = self.tmp_path / url.rsplit("=", 1)[1]
+        if url not in self.broken:
+            path.write_bytes(b"media " + url.encode())
+        return index.CachedMedia(str(path), 0, ext="mp4", content_type="video/mp4")
+
+
+def test_failed_cached_entry_gets_a_marker_and_a_valid_archive(monkeypatch, tmp_path):
+    listing = index.PlaylistListing(PLAYLIST)
+    urls = [f"https://www.youtube.com/watch?v=video{i:06d}" for i in range(3)]
+    listing._publish(
+        "Playlist", [{"id": u[-11:], "title": f"Song {i}", "url": u} for i, u in enumerate(urls)]
+    )
+    listing._finish()
+    monkeypatch.setattr(index.playlist_listings, "get", lambda url: listing)
+    downloader = _Downloader(tmp_path, broken={urls[1]})
+
+    async def main():
+        return b"".join([chunk async for chunk in downloader.playlist_archive(PLAYLIST)])
+
+    archive = zipfile.ZipFile(io.BytesIO(asyncio.run(main())))
+    names = archive.namelist()
+
+    assert archive.testzip() is None
+    assert names[:2] == ["001 - Song 0.mp4", "002 - Song 1.mp4"]
+    assert "002 - Song 1.mp4.failed.txt" in names
+    assert "003 - Song 2.mp4" in names
+    assert b"002 Song 1: truncated" in archive.read("_failed.txt")
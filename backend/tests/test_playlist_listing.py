@@ -0,0 +1,43 @@
+"""A playlist listing cut short must never look like the end of the playlist."""
+import asyncio
+import time
+
+from common import index
+
+FIRST = "https://www.youtube.com/playlist?list=PLaaaaaaaaaaaaaaaa"
+SECOND = "https://www.youtube.com/playlist?list=PLbbbbbbbbbbbbbbbb"
+
+
+def _walk(url, ydl_opts, on_title, on_page, page_size, max_entries, stop):
+    """A long playlist yt-dlp walks slowly, one entry at a time."""
+    on_title("Long playlist")
+    for i in range(max_entries):
+        if stop.is_set():
+            return
+        on_page([{"id": f"video{i:06d}", "url": f"https://www.youtube.com/watch?v=video{i:06d}"}])
+        time.sleep(0.002)
+
+
+def test_evicted_listing_ends_with_an_error_and_a_cursor(monkeypatch):
+    monkeypatch.setattr(index.extract_worker, "iter_playlist", _walk)
+    listings = index.PlaylistListings(max_listings=1, ttl=60, page_size=10, max_entries=5000)
+    monkeypatch.setattr(index, "playlist_listings", listings)
+
+    async def main():
+        events = []
+        async for event in index.StreamMeta().stream_playlist(FIRST):
+            events.append(event)
+            if event["type"] == "songs" and len(events) == 2:
+                listings.get(SECOND)  # pushes the first listing out while it is filling
+        listings.get(SECOND).cancel()
+        return events
+
+    events = asyncio.run(main())
+    end = events[-1]
+    received = sum(len(e["songs"]) for e in events if e["type"] == "songs")
+
+    assert end["type"] == "end"
+    assert "evicted" in end["error"]
+    assert end["count"] is None
+    assert end["next_cursor"] == received
+    assert received < 5000
@@ -0,0 +1,51 @@
+"""SingleFlight: a caller must never inherit a cancellation it didn't ask for."""
+import asyncio
+
+from common.index import SingleFlight
+
+
+def test_caller_arriving_while_the_last_waiter_leaves_gets_a_new_flight():
+    async def main():
+        flights = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.01)  # slow to unwind, like a queued extraction
+                raise
+            return len(runs)
+
+        first = asyncio.ensure_future(flights.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)  # the shared task is now cancelling
+        late = asyncio.ensure_future(flights.do("key", work))
+
+        assert await late == 2
+        assert first.cancelled()
+        assert flights.started == 2
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_concurrent_callers_share_one_run():
+    async def main():
+        flights = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return "info"
+
+        results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+        assert results == ["info"] * 5
+        assert len(runs) == 1
+        assert flights.coalesced == 4
+
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+"""
+One yt-dlp extraction per YouTube download: the itag fallback ladder is
+walked against the formats of a single recorded info dict.
+"""
+import asyncio
+import copy
+import urllib.parse
+
+import aiohttp
+import pytest
+import yt_dlp
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL as _URL
+
+from common import index
+from conftest import load_fixture
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def extractions(monkeypatch):
+    """Record every yt-dlp extract_info call and answer it from the fixture."""
+    info = load_fixture("youtube_watch.json")
+    calls = []
+
+    def extract_info(self, url, download=True, *args, **kwargs):
+        calls.append(url)
+        return copy.deepcopy(info)
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", extract_info)
+    return calls
+
+
+def _itag(media_url: str) -> str:
+    return urllib.parse.parse_qs(urllib.parse.urlparse(media_url).query)["itag"][0]
+
+
+class _Body:
+    """A tiny full-body MediaStream."""
+
+    status = 200
+    content_length = 4
+
+    def __init__(self, itag: str):
+        self.data = itag.encode().ljust(4, b".")
+
+    async def iter_chunks(self, chunk_size: int = 1024):
+        yield self.data
+
+    def close(self):
+        pass
+
+
+class _Downloader(index.StreamDownloader):
+    """Opens nothing upstream; records which itags were tried instead."""
+
+    def __init__(self, rejected=()):
+        super().__init__()
+        self.rejected = set(rejected)
+        self.opened = []
+        self.notices = []
+
+    async def _notify(self, token, message: str):
+        self.notices.append(message)
+
+    async def _open_url(self, media_url, byte_range=None, size_hint=None, refresh=None, platform=None):
+        itag = _itag(media_url)
+        self.opened.append(itag)
+        if itag in self.rejected:
+            request = aiohttp.RequestInfo(
+                _URL(media_url), "GET", CIMultiDictProxy(CIMultiDict()), _URL(media_url)
+            )
+            raise aiohttp.ClientResponseError(request, (), status=404, message="Not Found")
+        return _Body(itag)
+
+
+def test_direct_download_extracts_once(extractions):
+    downloader = _Downloader()
+
+    media = asyncio.run(downloader.open_stream(URL, itag="137"))
+
+    assert media.itag == "137"
+    assert downloader.opened == ["137"]
+    assert len(extractions) == 1
+
+
+def test_missing_itags_fall_back_without_reextracting(extractions):
+    # 248, 614 and 616 aren't in the recorded formats; 137 is the next 1080p itag
+    downloader = _Downloader()
+
+    media = asyncio.run(downloader.open_stream(URL, itag="248"))
+
+    assert media.itag == "137"
+    assert downloader.opened == ["137"]
+    assert len(extractions) == 1
+
+
+def test_rejected_itags_fall_back_without_reextracting(extractions):
+    downloader = _Downloader(rejected={"137", "247"})
+
+    media = asyncio.run(downloader.open_stream(URL, itag="137"))
+
+    assert media.itag == "136"
+    assert downloader.opened == ["137", "247", "136"]
+    assert len(extractions) == 1
+    assert any("Stepping down to 720" in notice for notice in downloader.notices)
+
+
+def test_audio_fallback_extracts_once(extractions):
+    downloader = _Downloader(rejected={"251"})
+
+    media = asyncio.run(downloader.open_stream(URL, itag="251"))
+
+    assert media.itag == "140"
+    assert len(extractions) == 1
+
+
+def test_every_itag_failing_still_extracts_once(extractions):
+    downloader = _Downloader(rejected={"249", "250", "251", "140"})
+
+    with pytest.raises(Exception):
+        asyncio.run(downloader.open_stream(URL, itag="251"))
+
+    assert downloader.opened == ["251", "140", "250", "249"]
+    assert len(extractions) == 1
+
+
+def test_download_after_listing_formats_reuses_the_extraction(extractions, monkeypatch):
+    async def no_sizes(media_id, formats):
+        return [f.get("filesize") for f in formats]
+
+    monkeypatch.setattr(index.size_resolver, "resolve", no_sizes)
+    downloader = _Downloader()
+
+    async def main():
+        meta = index.StreamMeta()
+        streams = await meta.fetch_streams(URL)
+        assert streams["success"], streams
+        return await downloader.open_stream(URL, itag="18")
+
+    assert asyncio.run(main()).itag == "18"
+    assert len(extractions) == 1
+
+
+def test_fallback_is_cached_under_the_itag_served(extractions, monkeypatch, tmp_path):
+    cache = index.MediaCache(root=str(tmp_path), max_bytes=1024 * 1024, enabled=True)
+    monkeypatch.setattr(index, "media_cache", cache)
+    downloader = _Downloader(rejected={"137"})  # e.g. a passing 503 on 1080p
+
+    async def main():
+        media = await downloader.open_stream(URL, itag="137")
+        async for _ in media.iter_chunks():
+            pass
+        return media
+
+    assert asyncio.run(main()).itag == "247"
+    assert cache.lookup(("youtube", "dQw4w9WgXcQ", "137")) is None
+    assert cache.lookup(("youtube", "dQw4w9WgXcQ", "247")) is not None
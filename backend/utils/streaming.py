@@ -0,0 +1,368 @@
+import asyncio
+import contextlib
+import json
+import mimetypes
+from typing import AsyncIterator, Awaitable, Callable, Dict
+
+import aiohttp
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse, FileResponse
+
+from common.index import (
+    StreamDownloader,
+    CachedMedia,
+    CircuitOpen,
+    ExtractionQueueFull,
+    ExtractionTimeout,
+    FfmpegBusy,
+    Overloaded,
+    RangeNotSatisfiable,
+    UnsupportedPlatformError,
+    admission,
+    bandwidth,
+    parse_range_header,
+    playlist_prefetcher,
+)
+from utils.logger import setup_logger
+
+logger = setup_logger("STREAMING")
+
+
+class _OffsetFileResponse(FileResponse):
+    """
+    FileResponse that treats the legacy ``start_byte`` field like
+    ``Range: bytes=N-`` and paces the body to ``client``'s bandwidth share.
+    """
+
+    def __init__(
+        self,
+        *args,
+        start_byte: int = 0,
+        on_abort: Callable[[], None] = None,
+        on_close: Callable[[], None] = None,
+        client: str = "",
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.start_byte = start_byte
+        self.on_abort = on_abort
+        self.on_close = on_close
+        self.client = client
+
+    async def __call__(self, scope, receive, send):
+        if self.start_byte and not any(k == b"range" for k, _ in scope["headers"]):
+            scope = {
+                **scope,
+                "headers": [*scope["headers"], (b"range", f"bytes={self.start_byte}-".encode())],
+            }
+        completed = False
+        try:
+            if bandwidth.enabled:
+                await self._send_paced(scope, receive, send)
+            else:
+                await super().__call__(scope, receive, send)
+            completed = True
+        finally:
+            if not completed and self.on_abort is not None:
+                self.on_abort()
+            if self.on_close is not None:
+                self.on_close()
+
+    async def _send_paced(self, scope, receive, send):
+        # pathsend would hand the whole file to the server in one go
+        extensions = {
+            k: v for k, v in scope.get("extensions", {}).items() if k != "http.response.pathsend"
+        }
+        with bandwidth.stream(self.client) as pace:
+
+            async def paced_send(message):
+                await send(message)
+                if message["type"] == "http.response.body":
+                    await pace(len(message.get("body", b"")))
+
+            await super().__call__({**scope, "extensions": extensions}, receive, paced_send)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that always closes its body iterator.
+
+    When the client goes away mid-body the plain response just stops
+    iterating, leaving the generator (and the upstream connection, ffmpeg
+    process or extraction jobs behind it) to be finalized whenever the
+    garbage collector gets to it. Closing it here runs its cleanup at once.
+    ``on_close`` is called once the body is done, however it ended.
+    """
+
+    def __init__(self, *args, on_close: Callable[[], None] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception as e:
+                    logger.warning("Error closing response body: %s", e)
+            if self.on_close is not None:
+                self.on_close()
+
+
+def _retry_later(error: Exception, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail=str(error), headers={"Retry-After": str(int(retry_after) + 1)}
+    )
+
+
+def unavailable_error(error: Exception) -> HTTPException:
+    """503 with Retry-After for an open platform circuit, 504 for an extraction timeout."""
+    if isinstance(error, CircuitOpen):
+        return _retry_later(error, error.retry_after)
+    return HTTPException(status_code=504, detail=str(error))
+
+
+def shed_extraction_load():
+    """Route dependency refusing metadata requests while extractions are backed up."""
+    try:
+        admission.check_extractions()
+    except Overloaded as e:
+        raise _retry_later(e, e.retry_after)
+
+
+def _client_key(request: Request, token: str = None) -> str:
+    """Who a stream belongs to, for fair sharing: the room token, else the client IP."""
+    return token or (request.client.host if request.client else "")
+
+
+async def _admitted(opener: Awaitable):
+    """Await ``opener`` holding a stream slot; the slot is kept only if it succeeds."""
+    try:
+        await admission.admit_stream()
+    except BaseException:
+        opener.close()  # never started
+        raise
+    try:
+        return await opener
+    except BaseException:
+        admission.release_stream()
+        raise
+
+
+async def _wait_for_disconnect(request: Request):
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _cancel_on_disconnect(request: Request, opener: Awaitable):
+    """
+    Await ``opener``, cancelling it if the client disconnects first, so
+    extraction queued or running only for that client is dropped.
+    """
+    task = asyncio.ensure_future(opener)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            # Let it unwind (release slots, close half-opened responses) before we go
+            await asyncio.gather(task, return_exceptions=True)
+    if task.cancelled():
+        logger.info("Client disconnected before the download started")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
+
+async def _open_media(url: str, opener: Awaitable, request: Request = None):
+    """
+    Await a StreamDownloader open call, mapping its failures to HTTP errors.
+    With ``request``, the open is abandoned if that client disconnects.
+    """
+    try:
+        if request is not None:
+            return await _cancel_on_disconnect(request, opener)
+        return await opener
+    except FfmpegBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    except (CircuitOpen, ExtractionTimeout) as e:
+        raise unavailable_error(e)
+    except Overloaded as e:
+        raise _retry_later(e, e.retry_after)
+    except ExtractionQueueFull as e:
+        raise _retry_later(e, admission.retry_after)
+    except RangeNotSatisfiable as e:
+        headers = {"Content-Range": f"bytes */{e.total}"} if e.total is not None else None
+        raise HTTPException(status_code=416, detail=str(e), headers=headers)
+    except UnsupportedPlatformError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except aiohttp.ClientResponseError as e:
+        logger.error("Upstream returned %s for %s", e.status, url)
+        raise HTTPException(status_code=502, detail=f"Upstream returned {e.status}")
+
+
+async def _notify_abort(chunks: AsyncIterator[bytes], on_abort: Callable[[], None]):
+    """Pass ``chunks`` through, calling ``on_abort`` if the body isn't sent to the end."""
+    completed = False
+    try:
+        async with contextlib.aclosing(chunks):
+            async for chunk in chunks:
+                yield chunk
+        completed = True
+    finally:
+        if not completed:
+            on_abort()
+
+
+def _media_response(
+    media,
+    file_id,
+    file_ext: str,
+    content_type: str,
+    on_abort: Callable[[], None] = None,
+    on_close: Callable[[], None] = None,
+    client: str = "",
+):
+    if getattr(media, "ext", None):
+        # ffmpeg output (or a cached copy of it) picks its own container
+        file_ext = media.ext
+        content_type = media.content_type
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{file_id}.{file_ext}"',
+        "X-Download-URL": str(file_id),
+        "format": file_ext,
+    }
+
+    if isinstance(media, CachedMedia):
+        # Served from local disk via sendfile; FileResponse handles Range itself
+        return _OffsetFileResponse(
+            media.path,
+            media_type=content_type,
+            headers=headers,
+            start_byte=media.start_byte,
+            on_abort=on_abort,
+            on_close=on_close,
+            client=client,
+        )
+
+    headers.update({"Content-Type": content_type, **media.headers})
+
+    chunks = bandwidth.throttle(client, media.iter_chunks())
+    if on_abort is not None:
+        chunks = _notify_abort(chunks, on_abort)
+
+    return ClosingStreamingResponse(
+        chunks,
+        status_code=media.status,
+        media_type=content_type,
+        headers=headers,
+        on_close=on_close,
+    )
+
+
+async def download_response(
+    downloader: StreamDownloader, request: Request, data, token: str = None
+):
+    """
+    Open the upstream media for a download request and wrap it in a response.
+
+    A ``Range`` request header is forwarded upstream and answered with
+    ``206 Partial Content``; otherwise the legacy ``start_byte`` field is used
+    as the resume offset. Length and range go in headers, never in the body.
+    """
+    file_ext = data.ext or "mp4"
+    content_type = mimetypes.guess_type(f"file.{file_ext}")[0] or "video/mp4"
+    byte_range = parse_range_header(request.headers.get("range"))
+
+    mux = getattr(data, "mux", False)
+    if mux and (byte_range or data.start_byte):
+        raise HTTPException(status_code=400, detail="Resuming a muxed download is not supported")
+
+    if mux:
+        opener = downloader.open_muxed(data.url, itag=data.itag, token=token)
+    else:
+        opener = downloader.open_stream(
+            data.url,
+            itag=data.itag,
+            byte_range=byte_range,
+            start_byte=data.start_byte or 0,
+            token=token,
+        )
+    media = await _open_media(data.url, _admitted(opener), request)
+
+    client = _client_key(request, token)
+    prefetch = None
+    playlist = getattr(data, "listUrl", None)
+    if playlist:
+        # Walking a playlist: warm the next items' extraction while this one streams
+        prefetch = playlist_prefetcher.advance(client, playlist, data.url, downloader.prefetch_info)
+    return _media_response(
+        media,
+        data.id,
+        file_ext,
+        content_type,
+        on_abort=(lambda: playlist_prefetcher.stop(prefetch)) if prefetch else None,
+        on_close=admission.release_stream,
+        client=client,
+    )
+
+
+async def audio_response(downloader: StreamDownloader, request: Request, data):
+    """
+    Stream the audio track of a download request through the transcoder.
+
+    Fresh transcodes are streamed as ffmpeg produces them (no ranges); a
+    cached transcode is served from disk with full Range support.
+    """
+    media = await _open_media(
+        data.url, _admitted(downloader.open_audio(data.url, data.format, data.bitrate)), request
+    )
+    return _media_response(
+        media,
+        data.id,
+        data.format,
+        "audio/mpeg",
+        on_close=admission.release_stream,
+        client=_client_key(request),
+    )
+
+
+async def archive_response(downloader: StreamDownloader, request: Request, data):
+    """Stream a playlist as a ZIP archive, counted as one download stream."""
+    await _open_media(data.listUrl, admission.admit_stream(), request)
+    return ClosingStreamingResponse(
+        bandwidth.throttle(
+            _client_key(request), downloader.playlist_archive(data.listUrl, data.itag or "best")
+        ),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="playlist.zip"'},
+        on_close=admission.release_stream,
+    )
+
+
+def event_stream_response(request: Request, events: AsyncIterator[Dict]):
+    """
+    Stream JSON objects as they are produced: newline-delimited JSON by
+    default, or server-sent events when the client accepts
+    ``text/event-stream``.
+    """
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    async def body():
+        async with contextlib.aclosing(events):
+            async for event in events:
+                line = json.dumps(event, default=str)
+                yield f"data: {line}\n\n" if sse else f"{line}\n"
+
+    return ClosingStreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -226,7 +226,8 @@ export const useDownloadStore = defineStore('downloadStore', {
         }
 
         // Stream processing setup
-        let contentLength = this.activeFilesize * 1024 * 1024;
+        const headerLength = parseInt(headers.get("Content-Length"), 10);
+        let contentLength = headerLength > 0 ? headerLength : this.activeFilesize * 1024 * 1024;
         let downloadedSize = 0;
         const startTime = performance.now();
         const chunks = [];
@@ -242,18 +243,6 @@ export const useDownloadStore = defineStore('downloadStore', {
           const { done, value } = await reader.read();
           if (done) break;
 
-          // Handle initial content-length metadata
-          if (downloadedSize === 0) {
-            const headerStr = new TextDecoder().decode(value);
-            const lengthMatch = headerStr.match(/^\[CONTENT-LENGTH:(\d+)\]/);
-            if (lengthMatch) {
-              contentLength = parseInt(lengthMatch[1]);
-              chunks.push(value.slice(lengthMatch[0].length));
-              downloadedSize = chunks[0].length;
-              continue;
-            }
-          }
-
           chunks.push(value);
           downloadedSize += value.length;
 